@@ -5,9 +5,10 @@ A.R.C SENTINEL - Configuration Management
 Centralized configuration using pydantic-settings
 """
 
-from pydantic_settings import BaseSettings
-from typing import Optional
-from functools import lru_cache
+from pydantic import computed_field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional, Tuple
+from functools import cached_property, lru_cache
 import os
 
 
@@ -21,6 +22,8 @@ class Settings(BaseSettings):
     
     # Gemini AI
     GEMINI_API_KEY: str = ""
+    GEMINI_CONCURRENCY: int = 4
+    GEMINI_TIMEOUT_S: float = 30.0
     
     # CORS
     CORS_ORIGINS: str = "*"
@@ -33,19 +36,34 @@ class Settings(BaseSettings):
     # Telemetry
     TELEMETRY_INTERVAL_SECONDS: int = 5
     
+    # Threat intelligence: extra blacklisted ranges, comma-separated CIDRs
+    BLACKLIST_NETWORKS: str = ""
+    
     # ML Configuration
     ML_ANOMALY_THRESHOLD: float = 0.75
     ML_CONTAMINATION: float = 0.1
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        extra = "ignore"
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore",
+        frozen=True,
+    )
+    
+    @computed_field
+    @cached_property
+    def cors_origins(self) -> Tuple[str, ...]:
+        """CORS_ORIGINS split into a tuple, computed once"""
+        return tuple(o.strip() for o in self.CORS_ORIGINS.split(",") if o.strip())
 
 
 @lru_cache()
 def get_settings() -> Settings:
     """Get cached settings instance"""
+    # SETTINGS_SKIP_ENV_FILE=1 (see .env.example / DEPLOYMENT.md) skips .env
+    # parsing for deploys that inject config through the OS environment
+    if os.environ.get("SETTINGS_SKIP_ENV_FILE") == "1":
+        return Settings(_env_file=None)
     return Settings()
 
 
@@ -4,6 +4,8 @@ A.R.C SENTINEL - Demo Mode Configuration
 Global flag and hardcoded responses for hackathon demo
 """
 
+import json
+
 # 🚨 DEMO MODE: Set to True for hackathon presentation
 DEMO_MODE = True
 
@@ -159,3 +161,18 @@ Key findings:
 
 Risk Level: HIGH
 Immediate action required. Recommend network isolation and credential reset."""
+
+# Pre-serialized demo forensic columns - the payloads are constant, so encode
+# them once on first access (PEP 562) instead of on every incident
+_DEMO_JSON_SOURCES = {
+    "DEMO_PROCESSES_JSON": "processes",
+    "DEMO_CONNECTIONS_JSON": "connections",
+}
+
+
+def __getattr__(name):
+    if name in _DEMO_JSON_SOURCES:
+        value = json.dumps(DEMO_FORENSIC_REPORT[_DEMO_JSON_SOURCES[name]])
+        globals()[name] = value  # later lookups skip __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,26 +4,60 @@ A.R.C SENTINEL - Database & Auth (Supabase)
 Handles all database operations and Supabase Auth
 """
 
-from supabase import create_client, Client
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Dict, Any, List, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import asyncio
+import base64
+import hashlib
 import json
+import logging
+import time
+
+# orjson is a much faster C decoder; fall back to stdlib json if unavailable
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from app.config import settings
 
+# Per-request failures go through the app logger (configured in main.py)
+logger = logging.getLogger("arc_sentinel")
+
+# supabase pulls in httpx/gotrue/postgrest/realtime; only import it once a
+# client is actually created
+if TYPE_CHECKING:
+    from supabase import Client
+
 
 class SupabaseClient:
     """Supabase client wrapper for database and auth operations"""
     
-    _instance: Optional[Client] = None
+    _instance: Optional["Client"] = None
+    _admin_instance: Optional["Client"] = None
     
     @classmethod
-    def get_client(cls) -> Optional[Client]:
+    def get_client(cls) -> Optional["Client"]:
         """Get or create Supabase client singleton"""
         if cls._instance is None and settings.SUPABASE_URL and settings.SUPABASE_KEY:
-            cls._instance = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+            import httpx
+            from supabase import create_client, ClientOptions
+            
+            # Bound every PostgREST call so a hung socket can't hold a worker forever
+            options = ClientOptions(postgrest_client_timeout=httpx.Timeout(5.0, connect=2.0))
+            cls._instance = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options=options)
         return cls._instance
     
+    @classmethod
+    def get_admin_client(cls) -> Optional["Client"]:
+        """Get or create the service-role client (privileged Storage access)"""
+        if cls._admin_instance is None and settings.SUPABASE_URL and settings.SUPABASE_SERVICE_ROLE_KEY:
+            from supabase import create_client
+            cls._admin_instance = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+        return cls._admin_instance
+    
     @classmethod
     def is_connected(cls) -> bool:
         """Check if database is connected"""
@@ -37,10 +71,58 @@ Database = SupabaseClient
 db = SupabaseClient.get_client()
 
 
+@lru_cache(maxsize=1)
+def _client_errors() -> tuple:
+    """Exceptions raised by the Supabase client for API and network failures"""
+    import httpx
+    from postgrest.exceptions import APIError
+    try:
+        from supabase_auth.errors import AuthError
+    except ImportError:  # supabase < 2.8 ships the auth client as gotrue
+        from gotrue.errors import AuthError
+    return (APIError, AuthError, httpx.HTTPError)
+
+
+async def _exec(query):
+    """
+    Execute a supabase-py query in a worker thread.
+    The client is synchronous, so calling execute() directly would block the event loop.
+    """
+    return await asyncio.to_thread(query.execute)
+
+
 # ============================================================================
 # SUPABASE AUTH FUNCTIONS
 # ============================================================================
 
+# User roles rarely change, so cache them per email: email -> (role, expires_at)
+_ROLE_CACHE: Dict[str, Tuple[str, float]] = {}
+_ROLE_CACHE_TTL_SECONDS = 300.0
+_ROLE_CACHE_MAX_SIZE = 4096
+
+
+async def _get_user_role(email: str) -> str:
+    """Get a user's role from the users table, cached for a few minutes"""
+    cached = _ROLE_CACHE.get(email)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+    
+    role = "analyst"  # default role
+    try:
+        user_data = await _exec(db.table("users").select("role").eq("email", email))
+        if user_data.data and len(user_data.data) > 0:
+            role = user_data.data[0].get("role", "analyst")
+    except _client_errors():
+        # Don't cache the default when the lookup itself failed
+        return role
+    
+    if len(_ROLE_CACHE) >= _ROLE_CACHE_MAX_SIZE:
+        # Evict the oldest entry (dicts keep insertion order)
+        _ROLE_CACHE.pop(next(iter(_ROLE_CACHE)))
+    _ROLE_CACHE[email] = (role, time.monotonic() + _ROLE_CACHE_TTL_SECONDS)
+    return role
+
+
 async def sign_up_user(email: str, password: str) -> Dict[str, Any]:
     """
     Sign up a new user with email verification.
@@ -50,7 +132,7 @@ async def sign_up_user(email: str, password: str) -> Dict[str, Any]:
         raise Exception("Database not connected")
     
     try:
-        response = db.auth.sign_up({
+        response = await asyncio.to_thread(db.auth.sign_up, {
             "email": email,
             "password": password
         })
@@ -85,20 +167,14 @@ async def sign_in_user(email: str, password: str) -> Dict[str, Any]:
         raise Exception("Database not connected")
     
     try:
-        response = db.auth.sign_in_with_password({
+        response = await asyncio.to_thread(db.auth.sign_in_with_password, {
             "email": email,
             "password": password
         })
         
         if response.user and response.session:
             # Get user role from users table
-            role = "analyst"  # default role
-            try:
-                user_data = db.table("users").select("role").eq("email", email).execute()
-                if user_data.data and len(user_data.data) > 0:
-                    role = user_data.data[0].get("role", "analyst")
-            except:
-                pass
+            role = await _get_user_role(email)
             
             return {
                 "user": {
@@ -133,14 +209,57 @@ async def sign_out_user(access_token: str) -> bool:
     if not db:
         return False
     
+    _TOKEN_CACHE.pop(_token_key(access_token), None)
     try:
-        db.auth.sign_out()
+        await asyncio.to_thread(db.auth.sign_out)
         return True
-    except:
+    except _client_errors():
         return False
 
 
-async def get_user_from_token(access_token: str) -> Optional[Dict[str, Any]]:
+@dataclass(slots=True, frozen=True)
+class AuthUser:
+    """Authenticated user resolved from an access token"""
+    id: str
+    email: Optional[str]
+    role: str = "analyst"
+    email_confirmed: bool = False
+
+
+# Verified tokens: sha256(token) -> (AuthUser, expires_at). Lets repeated
+# requests with the same token skip the auth.get_user round trip.
+_TOKEN_CACHE: Dict[str, Tuple[AuthUser, float]] = {}
+_TOKEN_CACHE_TTL_SECONDS = 60.0
+_TOKEN_CACHE_MAX_SIZE = 4096
+
+
+def _token_key(access_token: str) -> str:
+    """Cache key for a token (hash of the whole token - JWT prefixes are shared)"""
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _token_expiry(access_token: str) -> Optional[float]:
+    """
+    The JWT's `exp` claim (epoch seconds), read without verifying the
+    signature - only used to bound how long a Supabase-verified user is cached.
+    """
+    try:
+        payload = access_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _token_cache_ttl(access_token: str) -> float:
+    """Seconds a verified token may stay cached: the default TTL, capped at its expiry"""
+    expiry = _token_expiry(access_token)
+    if expiry is None:
+        return _TOKEN_CACHE_TTL_SECONDS
+    return min(_TOKEN_CACHE_TTL_SECONDS, expiry - time.time())
+
+
+async def get_user_from_token(access_token: str) -> Optional[AuthUser]:
     """
     Verify access token and get user info.
     This validates the Supabase JWT.
@@ -148,32 +267,42 @@ async def get_user_from_token(access_token: str) -> Optional[Dict[str, Any]]:
     if not db:
         return None
     
+    key = _token_key(access_token)
+    cached = _TOKEN_CACHE.get(key)
+    if cached:
+        if time.monotonic() < cached[1]:
+            return cached[0]
+        del _TOKEN_CACHE[key]
+    
     try:
         # Get user from token
-        response = db.auth.get_user(access_token)
+        response = await asyncio.to_thread(db.auth.get_user, access_token)
         
         if response and response.user:
             user = response.user
             
             # Get additional user data from users table
-            role = "analyst"
-            try:
-                user_data = db.table("users").select("role, full_name").eq("email", user.email).execute()
-                if user_data.data and len(user_data.data) > 0:
-                    role = user_data.data[0].get("role", "analyst")
-            except:
-                pass
+            role = await _get_user_role(user.email)
             
-            return {
-                "id": user.id,
-                "email": user.email,
-                "role": role,
-                "email_confirmed": user.email_confirmed_at is not None
-            }
+            auth_user = AuthUser(
+                id=user.id,
+                email=user.email,
+                role=role,
+                email_confirmed=user.email_confirmed_at is not None
+            )
+            
+            # Never serve a cached user past the token's own expiry
+            ttl = _token_cache_ttl(access_token)
+            if ttl > 0:
+                if len(_TOKEN_CACHE) >= _TOKEN_CACHE_MAX_SIZE:
+                    # Evict the oldest entry (dicts keep insertion order)
+                    _TOKEN_CACHE.pop(next(iter(_TOKEN_CACHE)))
+                _TOKEN_CACHE[key] = (auth_user, time.monotonic() + ttl)
+            return auth_user
         return None
         
     except Exception as e:
-        print(f"[AUTH] Token verification error: {e}")
+        logger.error("[AUTH] Token verification error: %s", e)
         return None
 
 
@@ -183,7 +312,7 @@ async def refresh_session(refresh_token: str) -> Optional[Dict[str, Any]]:
         return None
     
     try:
-        response = db.auth.refresh_session(refresh_token)
+        response = await asyncio.to_thread(db.auth.refresh_session, refresh_token)
         
         if response.session:
             return {
@@ -194,7 +323,7 @@ async def refresh_session(refresh_token: str) -> Optional[Dict[str, Any]]:
         return None
         
     except Exception as e:
-        print(f"[AUTH] Refresh error: {e}")
+        logger.error("[AUTH] Refresh error: %s", e)
         return None
 
 
@@ -204,9 +333,9 @@ async def reset_password(email: str) -> bool:
         return False
     
     try:
-        db.auth.reset_password_email(email)
+        await asyncio.to_thread(db.auth.reset_password_email, email)
         return True
-    except:
+    except _client_errors():
         return False
 
 
@@ -216,9 +345,9 @@ async def update_user_password(access_token: str, new_password: str) -> bool:
         return False
     
     try:
-        db.auth.update_user({"password": new_password})
+        await asyncio.to_thread(db.auth.update_user, {"password": new_password})
         return True
-    except:
+    except _client_errors():
         return False
 
 
@@ -226,18 +355,72 @@ async def update_user_password(access_token: str, new_password: str) -> bool:
 # DATABASE CRUD FUNCTIONS
 # ============================================================================
 
+# JSONB columns of forensic_reports that may come back as encoded strings
+_FORENSIC_JSON_FIELDS = ("processes", "connections", "packet_data")
+
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO-8601 string"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _json_dumps(value: Any) -> str:
+    """Serialize a value to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def _maybe_parse(value: Any) -> Any:
+    """Decode a JSON string/bytes value; values PostgREST already parsed pass through"""
+    if isinstance(value, (str, bytes)):
+        return orjson.loads(value) if orjson is not None else json.loads(value)
+    return value
+
+
+def _parse_forensic_fields(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse the JSONB fields of a forensic report in place"""
+    for field in _FORENSIC_JSON_FIELDS:
+        if field in report:
+            report[field] = _maybe_parse(report[field])
+    return report
+
+
 async def insert_event(event_data: Dict[str, Any]) -> Optional[Dict]:
     """Insert a new event into the database"""
     if not db:
         return None
     try:
-        result = db.table("events").insert(event_data).execute()
+        result = await _exec(db.table("events").insert(event_data))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error inserting event: {e}")
+        logger.error("Error inserting event: %s", e)
         return None
 
 
+# get_events filters: (parameter, PostgREST operator, column)
+_EVENT_FILTERS = (
+    ("severity", "eq", "severity"),
+    ("event_type", "eq", "type"),
+    ("start_time", "gte", "timestamp"),
+    ("end_time", "lte", "timestamp"),
+    ("source_ip", "eq", "source_ip"),
+    ("ml_flagged", "eq", "ml_flagged"),
+)
+
+
+def _filter_events(query, params: Dict[str, Any]):
+    """Apply the set get_events filters in `params` to an events query"""
+    for param, op, column in _EVENT_FILTERS:
+        value = params.get(param)
+        if value is None or value == "":
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        query = getattr(query, op)(column, value)
+    return query
+
+
 async def get_events(
     limit: int = 100,
     severity: Optional[str] = None,
@@ -251,40 +434,179 @@ async def get_events(
     if not db:
         return []
     try:
-        query = db.table("events").select("*")
-        
-        if severity:
-            query = query.eq("severity", severity)
-        if event_type:
-            query = query.eq("type", event_type)
-        if start_time:
-            query = query.gte("timestamp", start_time.isoformat())
-        if end_time:
-            query = query.lte("timestamp", end_time.isoformat())
-        if source_ip:
-            query = query.eq("source_ip", source_ip)
-        if ml_flagged is not None:
-            query = query.eq("ml_flagged", ml_flagged)
-        
-        result = query.order("timestamp", desc=True).limit(limit).execute()
+        query = _filter_events(db.table("events").select("*"), {
+            "severity": severity,
+            "event_type": event_type,
+            "start_time": start_time,
+            "end_time": end_time,
+            "source_ip": source_ip,
+            "ml_flagged": ml_flagged,
+        })
+        result = await _exec(query.order("timestamp", desc=True).limit(limit))
         return result.data or []
     except Exception as e:
-        print(f"Error getting events: {e}")
+        logger.error("Error getting events: %s", e)
         return []
 
 
+async def iter_events(page_size: int = 500, **filters: Any) -> AsyncIterator[Dict]:
+    """
+    Yield events newest-first one page at a time, so large scans keep only
+    `page_size` rows in memory. Accepts the same filters as get_events.
+    """
+    if not db:
+        return
+    unknown = set(filters) - {param for param, _, _ in _EVENT_FILTERS}
+    if unknown:
+        raise TypeError(f"Unknown event filters: {', '.join(sorted(unknown))}")
+    
+    # Keyset pagination on (timestamp, id): offsets shift under constant
+    # inserts and would repeat or skip rows between pages
+    last: Optional[Tuple[str, str]] = None
+    while True:
+        query = _filter_events(db.table("events").select("*"), filters)
+        if last:
+            ts, event_id = last
+            query = query.or_(
+                f'timestamp.lt."{ts}",and(timestamp.eq."{ts}",id.lt."{event_id}")'
+            )
+        query = query.order("timestamp", desc=True).order("id", desc=True).limit(page_size)
+        try:
+            result = await _exec(query)
+        except Exception as e:
+            logger.error("Error iterating events: %s", e)
+            return
+        
+        batch = result.data or []
+        for row in batch:
+            yield row
+        if len(batch) < page_size:
+            return
+        last = (batch[-1]["timestamp"], batch[-1]["id"])
+
+
+# Per-IP frequency counts, keyed by (source_ip, minutes, bucket). Keys roll
+# over every _FREQUENCY_BUCKET_SECONDS, so repeated lookups for a hot IP
+# within a bucket reuse one COUNT.
+_FREQUENCY_BUCKET_SECONDS = 10
+_FREQUENCY_CACHE_MAX_SIZE = 8192
+_frequency_cache: Dict[Tuple[str, int, int], int] = {}
+_frequency_cache_bucket = 0
+
+
 async def get_event_frequency(source_ip: str, minutes: int = 5) -> int:
     """Get count of events from a source IP in the last N minutes"""
+    global _frequency_cache_bucket
     if not db:
         return 0
+    
+    bucket = int(time.time()) // _FREQUENCY_BUCKET_SECONDS
+    if bucket != _frequency_cache_bucket:
+        # Every cached key belongs to an older bucket now
+        _frequency_cache.clear()
+        _frequency_cache_bucket = bucket
+    key = (source_ip, minutes, bucket)
+    cached = _frequency_cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        from datetime import timedelta
-        cutoff = (datetime.utcnow() - timedelta(minutes=minutes)).isoformat()
-        result = db.table("events").select("*", count="exact").eq("source_ip", source_ip).gte("timestamp", cutoff).execute()
-        return result.count or 0
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
+        result = await _exec(db.table("events").select("id", count="exact", head=True).eq("source_ip", source_ip).gte("timestamp", cutoff))
+        count = result.count or 0
     except Exception as e:
-        print(f"Error getting event frequency: {e}")
+        logger.error("Error getting event frequency: %s", e)
         return 0
+    
+    if len(_frequency_cache) >= _FREQUENCY_CACHE_MAX_SIZE:
+        _frequency_cache.clear()
+    _frequency_cache[key] = count
+    return count
+
+
+async def get_event_frequencies(source_ips: List[str], minutes: int = 5) -> Dict[str, int]:
+    """Get event counts for many source IPs in the last N minutes with one query"""
+    if not db or not source_ips:
+        return {}
+    ips = list(dict.fromkeys(source_ips))
+    try:
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
+        result = await _exec(db.rpc("ip_event_counts", {"ips": ips, "cutoff": cutoff}))
+    except Exception as e:
+        logger.warning("Error getting batched event frequencies, querying per IP: %s", e)
+        return {ip: await get_event_frequency(ip, minutes) for ip in ips}
+    
+    counts = dict.fromkeys(ips, 0)
+    for row in result.data or []:
+        counts[row["ip"]] = row["cnt"]
+    
+    # Seed the per-IP cache so follow-up single lookups are free
+    bucket = int(time.time()) // _FREQUENCY_BUCKET_SECONDS
+    if bucket == _frequency_cache_bucket and len(_frequency_cache) + len(counts) <= _FREQUENCY_CACHE_MAX_SIZE:
+        for ip, count in counts.items():
+            _frequency_cache[(ip, minutes, bucket)] = count
+    return counts
+
+
+@dataclass
+class _TotalCountCache:
+    """Short-lived cache of the total events count shared by the rarity lookups"""
+    value: int = 0
+    expires_at: float = 0.0
+
+
+_total_events_cache = _TotalCountCache()
+_total_events_lock = asyncio.Lock()
+
+
+async def _get_total_events_cached(ttl: float = 30.0) -> int:
+    """
+    Get the total number of events, refreshed at most once per `ttl` seconds.
+    The total changes slowly, so the rarity calculations can share one COUNT.
+    """
+    if time.monotonic() < _total_events_cache.expires_at:
+        return _total_events_cache.value
+    
+    async with _total_events_lock:
+        # Another caller may have refreshed while we waited for the lock
+        if time.monotonic() < _total_events_cache.expires_at:
+            return _total_events_cache.value
+        
+        result = await _exec(db.table("events").select("id", count="exact", head=True))
+        _total_events_cache.value = result.count or 0
+        _total_events_cache.expires_at = time.monotonic() + ttl
+        return _total_events_cache.value
+
+
+# Cleared once Postgres reports the rarity functions don't exist (schema not
+# deployed); transient failures only fall back for that one call
+_rarity_rpc_available = True
+
+# PostgREST "function not found in schema cache" / Postgres undefined_function
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+async def _rarity_rpc(function: str, params: Dict[str, Any]) -> Optional[float]:
+    """Compute a rarity score in Postgres; None means use the client-side path"""
+    global _rarity_rpc_available
+    if not _rarity_rpc_available:
+        return None
+    from postgrest.exceptions import APIError
+    try:
+        result = await _exec(db.rpc(function, params))
+    except APIError as e:
+        if e.code in _MISSING_FUNCTION_CODES:
+            logger.warning("[DB] Rarity RPC %s not deployed, counting client-side from now on: %s", function, e)
+            _rarity_rpc_available = False
+        else:
+            logger.warning("[DB] Rarity RPC %s failed, counting client-side: %s", function, e)
+        return None
+    except Exception as e:
+        logger.warning("[DB] Rarity RPC %s failed, counting client-side: %s", function, e)
+        return None
+    if result.data is None:
+        return None
+    return round(float(result.data), 4)
 
 
 async def get_event_type_rarity(event_type: str) -> float:
@@ -292,20 +614,24 @@ async def get_event_type_rarity(event_type: str) -> float:
     if not db:
         return 0.5
     try:
-        total = db.table("events").select("*", count="exact").execute()
-        type_count = db.table("events").select("*", count="exact").eq("type", event_type).execute()
-        
-        total_count = total.count or 1
-        event_count = type_count.count or 0
-        
+        total_count = await _get_total_events_cached()
+        # No history yet: neither rare nor common
         if total_count == 0:
             return 0.5
+        # One indexed count in Postgres against the cached total
+        rarity = await _rarity_rpc("event_type_rarity", {"etype": event_type, "total": total_count})
+        if rarity is not None:
+            return rarity
+        type_count = await _exec(db.table("events").select("id", count="exact", head=True).eq("type", event_type))
         
-        ratio = event_count / total_count
+        event_count = type_count.count or 0
+        
+        # The cached total can lag behind the live filtered count
+        ratio = min(event_count / total_count, 1.0)
         rarity = 1.0 - ratio
         return round(rarity, 4)
     except Exception as e:
-        print(f"Error calculating event rarity: {e}")
+        logger.error("Error calculating event rarity: %s", e)
         return 0.5
 
 
@@ -314,20 +640,23 @@ async def get_ip_rarity(source_ip: str) -> float:
     if not db:
         return 0.5
     try:
-        total = db.table("events").select("*", count="exact").execute()
-        ip_count = db.table("events").select("*", count="exact").eq("source_ip", source_ip).execute()
-        
-        total_count = total.count or 1
-        ip_events = ip_count.count or 0
-        
+        total_count = await _get_total_events_cached()
+        # No history yet: neither rare nor common
         if total_count == 0:
             return 0.5
+        # One indexed count in Postgres against the cached total
+        rarity = await _rarity_rpc("ip_rarity", {"ip_addr": source_ip, "total": total_count})
+        if rarity is not None:
+            return rarity
+        ip_count = await _exec(db.table("events").select("id", count="exact", head=True).eq("source_ip", source_ip))
+        
+        ip_events = ip_count.count or 0
         
-        ratio = ip_events / total_count
+        ratio = min(ip_events / total_count, 1.0)
         rarity = 1.0 - ratio
         return round(rarity, 4)
     except Exception as e:
-        print(f"Error calculating IP rarity: {e}")
+        logger.error("Error calculating IP rarity: %s", e)
         return 0.5
 
 
@@ -336,15 +665,15 @@ async def log_audit(user_id: str, action: str, details: Dict[str, Any]) -> Optio
     if not db:
         return None
     try:
-        result = db.table("audit_log").insert({
+        result = await _exec(db.table("audit_log").insert({
             "user_id": user_id,
             "action": action,
-            "details": json.dumps(details),
-            "timestamp": datetime.utcnow().isoformat()
-        }).execute()
+            "details": _json_dumps(details),
+            "timestamp": _now_iso()
+        }))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error logging audit: {e}")
+        logger.error("Error logging audit: %s", e)
         return None
 
 
@@ -353,15 +682,15 @@ async def mark_device_isolated(device_id: str, source_ip: str) -> Optional[Dict]
     if not db:
         return None
     try:
-        result = db.table("devices").upsert({
+        result = await _exec(db.table("devices").upsert({
             "id": device_id,
             "source_ip": source_ip,
             "status": "isolated",
-            "isolated_at": datetime.utcnow().isoformat()
-        }).execute()
+            "isolated_at": _now_iso()
+        }))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error marking device isolated: {e}")
+        logger.error("Error marking device isolated: %s", e)
         return None
 
 
@@ -370,10 +699,10 @@ async def insert_incident(incident_data: Dict[str, Any]) -> Optional[Dict]:
     if not db:
         return None
     try:
-        result = db.table("incidents").insert(incident_data).execute()
+        result = await _exec(db.table("incidents").insert(incident_data))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error inserting incident: {e}")
+        logger.error("Error inserting incident: %s", e)
         return None
 
 
@@ -390,10 +719,10 @@ async def get_incidents(
         if status:
             query = query.eq("status", status)
         
-        result = query.order("created_at", desc=True).limit(limit).execute()
+        result = await _exec(query.order("created_at", desc=True).limit(limit))
         return result.data or []
     except Exception as e:
-        print(f"Error getting incidents: {e}")
+        logger.error("Error getting incidents: %s", e)
         return []
 
 
@@ -402,10 +731,10 @@ async def get_incident_by_id(incident_id: str) -> Optional[Dict]:
     if not db:
         return None
     try:
-        result = db.table("incidents").select("*").eq("id", incident_id).execute()
+        result = await _exec(db.table("incidents").select("*").eq("id", incident_id))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error getting incident: {e}")
+        logger.error("Error getting incident: %s", e)
         return None
 
 
@@ -414,10 +743,10 @@ async def update_incident(incident_id: str, update_data: Dict[str, Any]) -> Opti
     if not db:
         return None
     try:
-        result = db.table("incidents").update(update_data).eq("id", incident_id).execute()
+        result = await _exec(db.table("incidents").update(update_data).eq("id", incident_id))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error updating incident: {e}")
+        logger.error("Error updating incident: %s", e)
         return None
 
 
@@ -426,10 +755,10 @@ async def insert_forensic_report(report_data: Dict[str, Any]) -> Optional[Dict]:
     if not db:
         return None
     try:
-        result = db.table("forensic_reports").insert(report_data).execute()
+        result = await _exec(db.table("forensic_reports").insert(report_data))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error inserting forensic report: {e}")
+        logger.error("Error inserting forensic report: %s", e)
         return None
 
 
@@ -438,17 +767,13 @@ async def get_forensic_report(incident_id: str) -> Optional[Dict]:
     if not db:
         return None
     try:
-        result = db.table("forensic_reports").select("*").eq("incident_id", incident_id).execute()
+        result = await _exec(db.table("forensic_reports").select("*").eq("incident_id", incident_id))
         if result.data:
-            report = result.data[0]
             # Parse JSONB fields
-            for field in ['processes', 'connections', 'packet_data']:
-                if field in report and isinstance(report[field], str):
-                    report[field] = json.loads(report[field])
-            return report
+            return _parse_forensic_fields(result.data[0])
         return None
     except Exception as e:
-        print(f"Error getting forensic report: {e}")
+        logger.error("Error getting forensic report: %s", e)
         return None
 
 
@@ -457,15 +782,13 @@ async def get_all_forensic_reports(limit: int = 100) -> List[Dict]:
     if not db:
         return []
     try:
-        result = db.table("forensic_reports").select("*, incidents(*)").order("created_at", desc=True).limit(limit).execute()
+        result = await _exec(db.table("forensic_reports").select("*, incidents(*)").order("created_at", desc=True).limit(limit))
         reports = result.data or []
         for report in reports:
-            for field in ['processes', 'connections', 'packet_data']:
-                if field in report and isinstance(report[field], str):
-                    report[field] = json.loads(report[field])
+            _parse_forensic_fields(report)
         return reports
     except Exception as e:
-        print(f"Error getting forensic reports: {e}")
+        logger.error("Error getting forensic reports: %s", e)
         return []
 
 
@@ -474,48 +797,97 @@ async def update_forensic_report(incident_id: str, update_data: Dict[str, Any])
     if not db:
         return None
     try:
-        result = db.table("forensic_reports").update(update_data).eq("incident_id", incident_id).execute()
+        result = await _exec(db.table("forensic_reports").update(update_data).eq("incident_id", incident_id))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error updating forensic report: {e}")
+        logger.error("Error updating forensic report: %s", e)
         return None
 
 
+# Pickled models are stored as raw bytes in Supabase Storage; the ml_model
+# row only keeps the training metadata. The bucket is restricted to the
+# service role: whatever is stored there gets unpickled by the backend.
+ML_MODEL_BUCKET = "ml-models"
+ML_MODEL_PATH = "current.pkl"
+
+
+@lru_cache(maxsize=1)
+def _storage_errors() -> tuple:
+    """Exceptions raised by the Storage client for API and network failures"""
+    import httpx
+    try:
+        from storage3.exceptions import StorageApiError as StorageError
+    except ImportError:  # older storage3 releases
+        from storage3.utils import StorageException as StorageError
+    return (StorageError, httpx.HTTPError)
+
+
+def _model_storage():
+    """The ml-models bucket via the service-role client, or None if no service key is set"""
+    admin = SupabaseClient.get_admin_client()
+    return admin.storage.from_(ML_MODEL_BUCKET) if admin else None
+
+
 async def save_ml_model(model_bytes: bytes) -> Optional[Dict]:
-    """Save ML model to database"""
+    """Save ML model to Supabase Storage (legacy base64 column without a service key)"""
     if not db:
         return None
     try:
-        import base64
-        model_b64 = base64.b64encode(model_bytes).decode('utf-8')
+        storage = _model_storage()
+        if storage is not None:
+            await asyncio.to_thread(
+                storage.upload,
+                ML_MODEL_PATH,
+                model_bytes,
+                {"content-type": "application/octet-stream", "upsert": "true"}
+            )
+            model_data = None  # clear any legacy base64 blob
+        else:
+            logger.warning("[ML] SUPABASE_SERVICE_ROLE_KEY not set; storing model in the ml_model table")
+            model_data = base64.b64encode(model_bytes).decode("utf-8")
         
         # Upsert (update if exists, insert if not)
-        result = db.table("ml_model").upsert({
+        result = await _exec(db.table("ml_model").upsert({
             "id": 1,
-            "model_data": model_b64,
-            "trained_at": datetime.utcnow().isoformat()
-        }).execute()
+            "model_data": model_data,
+            "trained_at": _now_iso()
+        }))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error saving ML model: {e}")
+        logger.error("Error saving ML model: %s", e)
         return None
 
 
 async def load_ml_model() -> Optional[bytes]:
-    """Load ML model from database"""
+    """Load ML model from Supabase Storage"""
     if not db:
         return None
+    storage = _model_storage()
+    if storage is not None:
+        try:
+            return await asyncio.to_thread(storage.download, ML_MODEL_PATH)
+        except _storage_errors() as e:
+            logger.warning("[ML] Model not loaded from Storage (%s); trying legacy ml_model row", e)
+    
+    # Fall back to models saved before the move to Storage
     try:
-        import base64
-        result = db.table("ml_model").select("*").eq("id", 1).execute()
+        result = await _exec(db.table("ml_model").select("model_data").eq("id", 1))
         if result.data and result.data[0].get("model_data"):
             return base64.b64decode(result.data[0]["model_data"])
         return None
     except Exception as e:
-        print(f"Error loading ML model: {e}")
+        logger.error("Error loading ML model: %s", e)
         return None
 
 
+def _count(table: str, **filters: Any) -> int:
+    """Run a COUNT-only query (no rows returned) with optional equality filters"""
+    query = db.table(table).select("id", count="exact", head=True)
+    for column, value in filters.items():
+        query = query.eq(column, value)
+    return query.execute().count or 0
+
+
 async def get_stats() -> Dict[str, int]:
     """Get dashboard statistics"""
     if not db:
@@ -526,19 +898,22 @@ async def get_stats() -> Dict[str, int]:
             "ml_flagged": 0
         }
     try:
-        events = db.table("events").select("*", count="exact").execute()
-        incidents = db.table("incidents").select("*", count="exact").execute()
-        active = db.table("incidents").select("*", count="exact").eq("status", "active").execute()
-        ml_flagged = db.table("events").select("*", count="exact").eq("ml_flagged", True).execute()
+        # The Supabase client is synchronous, so run the counts in worker threads
+        events, incidents, active, ml_flagged = await asyncio.gather(
+            asyncio.to_thread(_count, "events"),
+            asyncio.to_thread(_count, "incidents"),
+            asyncio.to_thread(_count, "incidents", status="active"),
+            asyncio.to_thread(_count, "events", ml_flagged=True)
+        )
         
         return {
-            "total_events": events.count or 0,
-            "total_incidents": incidents.count or 0,
-            "active_incidents": active.count or 0,
-            "ml_flagged": ml_flagged.count or 0
+            "total_events": events,
+            "total_incidents": incidents,
+            "active_incidents": active,
+            "ml_flagged": ml_flagged
         }
     except Exception as e:
-        print(f"Error getting stats: {e}")
+        logger.error("Error getting stats: %s", e)
         return {
             "total_events": 0,
             "total_incidents": 0,
@@ -552,10 +927,10 @@ async def get_user_by_email(email: str) -> Optional[Dict]:
     if not db:
         return None
     try:
-        result = db.table("users").select("*").eq("email", email).execute()
+        result = await _exec(db.table("users").select("*").eq("email", email))
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error getting user: {e}")
+        logger.error("Error getting user: %s", e)
         return None
 
 
@@ -564,14 +939,15 @@ async def create_or_update_user_profile(user_id: str, email: str, role: str = "a
     if not db:
         return None
     try:
-        result = db.table("users").upsert({
+        result = await _exec(db.table("users").upsert({
             "id": user_id,
             "email": email,
             "role": role,
-            "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+            "updated_at": _now_iso()
+        }))
+        _ROLE_CACHE.pop(email, None)
         return result.data[0] if result.data else None
     except Exception as e:
-        print(f"Error creating/updating user profile: {e}")
+        logger.error("Error creating/updating user profile: %s", e)
         return None
 
@@ -12,12 +12,34 @@ Features:
 - SQL injection pattern matching
 """
 
-from typing import Dict, Any, Optional, List, Tuple, Set
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from typing import Dict, Any, Iterable, Optional, List, Tuple, Set
 from dataclasses import dataclass, field
 from enum import Enum
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from functools import lru_cache
+from itertools import islice
+import ipaddress
+import re
+import sys
 import threading
+import time
+
+from app.config import settings
+
+
+# Event type names, interned so dispatch compares by identity
+LOGIN_EVENT = sys.intern("login_event")
+NETWORK_EVENT = sys.intern("network_event")
+PROCESS_EVENT = sys.intern("process_event")
+
+
+def intern_event_type(event: Dict[str, Any]) -> Optional[str]:
+    """Intern an event's type string in place (types parsed from JSON aren't)"""
+    event_type = event.get("type")
+    if isinstance(event_type, str):
+        event["type"] = event_type = sys.intern(event_type)
+    return event_type
 
 
 class ThreatType(str, Enum):
@@ -39,7 +61,7 @@ class Severity(str, Enum):
     CRITICAL = "critical"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DetectionResult:
     """Result of threat detection analysis"""
     is_threat: bool
@@ -47,65 +69,103 @@ class DetectionResult:
     severity: Optional[Severity]
     description: str
     confidence: float = 0.0
-    indicators: List[str] = None
-    
-    def __post_init__(self):
-        if self.indicators is None:
-            self.indicators = []
-
-
-@dataclass
-class LoginAttempt:
-    """Tracks a single login attempt"""
-    timestamp: datetime
-    username: str
-    success: bool
-
-
-@dataclass
-class PortScanEvent:
-    """Tracks a port scan event"""
-    timestamp: datetime
-    port: int
-    destination_ip: str
-
-
-@dataclass
-class TrafficEvent:
-    """Tracks traffic volume for DDoS detection"""
-    timestamp: datetime
-    bytes: int
-    source_ip: str
+    indicators: Tuple[str, ...] = ()
 
 
 @dataclass
 class RoleChange:
     """Tracks user role changes for privilege escalation"""
-    timestamp: datetime
+    timestamp_ns: int  # time.monotonic_ns()
     from_role: str
     to_role: str
     user: str
 
 
+# Rank used to pick the most severe threat when several rules fire
+_SEVERITY_ORDER = {Severity.CRITICAL: 0, Severity.HIGH: 1, Severity.MEDIUM: 2, Severity.LOW: 3}
+
+# Shared negative results, so benign events don't allocate a result per check.
+# Callers must treat these as read-only.
+_NO_THREAT = DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+_NO_THREATS_DETECTED = DetectionResult(
+    is_threat=False,
+    threat_type=None,
+    severity=None,
+    description="No threats detected"
+)
+
+
 # Known malicious IPs (simulated threat intelligence)
-BLACKLIST_IPS = [
+# IOC sets are frozensets so membership checks stay O(1) as feeds grow
+BLACKLIST_IPS = frozenset({
     "45.33.32.156",      # Known scanner
     "198.51.100.42",     # C2 server
     "203.0.113.0",       # Botnet node
     "192.0.2.1",         # Malware distribution
     "10.255.255.1",      # Internal threat
-]
+})
+
+# Known malicious ranges in CIDR notation, from the comma-separated
+# BLACKLIST_NETWORKS setting (e.g. "203.0.113.0/24,198.51.100.0/24")
+BLACKLIST_NETWORKS: Tuple[str, ...] = tuple(
+    n.strip() for n in getattr(settings, "BLACKLIST_NETWORKS", "").split(",") if n.strip()
+)
+
+
+def _build_network_ranges(networks: Iterable[str]) -> Dict[int, Tuple[List[int], List[int]]]:
+    """
+    Merge CIDR ranges into sorted, non-overlapping (starts, ends) integer
+    lists per IP version, for bisect lookups.
+    """
+    by_version: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for network in networks:
+        net = ipaddress.ip_network(network, strict=False)
+        by_version[net.version].append((int(net.network_address), int(net.broadcast_address)))
+    
+    ranges = {}
+    for version, spans in by_version.items():
+        starts: List[int] = []
+        ends: List[int] = []
+        for start, end in sorted(spans):
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        ranges[version] = (starts, ends)
+    return ranges
+
+
+_BLACKLIST_RANGES = _build_network_ranges(BLACKLIST_NETWORKS)
+
+
+def _in_blacklisted_network(ip: str) -> bool:
+    """Whether an IP falls inside any BLACKLIST_NETWORKS range (O(log n))"""
+    if not _BLACKLIST_RANGES:
+        return False
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    ranges = _BLACKLIST_RANGES.get(addr.version)
+    if not ranges:
+        return False
+    starts, ends = ranges
+    value = int(addr)
+    idx = bisect_right(starts, value) - 1
+    return idx >= 0 and value <= ends[idx]
+
 
 # Known malicious process hashes
-MALICIOUS_HASHES = [
+MALICIOUS_HASHES = frozenset({
     "abc123malicious",
     "def456ransomware",
     "ghi789trojan",
     "jkl012rootkit",
-]
+})
 
-# SQL Injection patterns
-SQLI_PATTERNS = [
+# SQL Injection patterns (ordered: the first listed match is reported)
+SQLI_PATTERNS = (
     "UNION SELECT",
     "DROP TABLE",
     "DELETE FROM",
@@ -116,10 +176,47 @@ SQLI_PATTERNS = [
     "1=1",
     "OR 1=1",
     "' OR '",
-]
+)
+
+# All SQL injection patterns as one case-insensitive alternation, so each
+# string is scanned once instead of once per pattern
+_SQLI_RE = re.compile("|".join(re.escape(p) for p in SQLI_PATTERNS), re.IGNORECASE)
+
+# (pattern, upper-cased pattern) pairs for naming the pattern that matched
+_SQLI_PATTERNS_UPPER = tuple((p, p.upper()) for p in SQLI_PATTERNS)
+
+
+# Payloads longer than this skip the match cache, so large attacker-chosen
+# strings are never retained as cache keys
+SQLI_CACHE_MAX_LEN = 512
+
+
+def _sqli_search(check_str: str) -> Optional[str]:
+    """Return the SQL injection pattern found in a string, or None"""
+    match = _SQLI_RE.search(check_str)
+    if not match:
+        return None
+    # Report the first listed pattern present in the string
+    upper_str = check_str.upper()
+    return next(
+        (p for p, p_upper in _SQLI_PATTERNS_UPPER if p_upper in upper_str),
+        match.group(0)
+    )
+
+
+# Cached because replayed attacks and scanners resend identical payloads
+_sqli_search_cached = lru_cache(maxsize=4096)(_sqli_search)
+
+
+def _sqli_match(check_str: str) -> Optional[str]:
+    """Return the SQL injection pattern found in a string, or None"""
+    if len(check_str) > SQLI_CACHE_MAX_LEN:
+        return _sqli_search(check_str)
+    return _sqli_search_cached(check_str)
+
 
 # Suspicious process names
-SUSPICIOUS_PROCESSES = [
+SUSPICIOUS_PROCESSES = (
     "suspicious.exe",
     "mimikatz",
     "pwdump",
@@ -128,10 +225,30 @@ SUSPICIOUS_PROCESSES = [
     "rootkit",
     "cryptominer",
     "ransomware",
-]
+)
+
+# Suspicious process names as one case-insensitive alternation, so process
+# names needn't be lowercased just to be scanned
+_SUSPICIOUS_PROCESS_RE = re.compile(
+    "|".join(re.escape(p) for p in SUSPICIOUS_PROCESSES), re.IGNORECASE
+)
 
 # Privileged roles that trigger escalation detection
-PRIVILEGED_ROLES = ["root", "admin", "administrator", "sudo", "wheel", "superuser"]
+PRIVILEGED_ROLES = ("root", "admin", "administrator", "sudo", "wheel", "superuser")
+
+# Privilege elevation tools (matched against lowercased process names)
+ELEVATION_TOOLS = frozenset({"sudo", "su", "doas", "pkexec", "runas", "gsudo", "elevate"})
+
+
+_NS_PER_SECOND = 1_000_000_000
+
+
+def _bruteforce_confidence_table(threshold: int, max_count: int) -> Tuple[float, ...]:
+    """Brute force confidence for every failed-attempt count up to max_count"""
+    return tuple(
+        min(0.95, 0.5 + (count - threshold) * 0.1)
+        for count in range(max_count + 1)
+    )
 
 
 class DetectionEngine:
@@ -149,65 +266,236 @@ class DetectionEngine:
     # Configuration thresholds
     BRUTEFORCE_THRESHOLD = 5           # Max failed attempts before alert
     BRUTEFORCE_WINDOW_SECONDS = 30     # Time window for brute force
+    BRUTEFORCE_MAX_TRACKED = 256       # Max failed attempts remembered per IP
     PORT_SCAN_THRESHOLD = 10           # Max ports before alert
     PORT_SCAN_WINDOW_SECONDS = 60      # Time window for port scan
+    WINDOW_MAX_TRACKED = 10_000        # Max port scan / traffic entries remembered per IP
     DDOS_SPIKE_MULTIPLIER = 4.0        # Traffic spike threshold
     DDOS_WINDOW_SECONDS = 30           # Time window for DDoS detection
+    DDOS_BASELINE_ALPHA = 0.05         # Weight of each normal sample in the baseline EMA
     EXFIL_THRESHOLD_BYTES = 50000      # Bytes threshold for exfiltration
+    ROLE_CHANGE_RETENTION_SECONDS = 3600  # How long role changes are remembered
+    CLEANUP_INTERVAL_SECONDS = 10      # Min time between full memory sweeps
+    MAX_TRACKED_KEYS = 50_000          # Max IPs / users kept in each memory window
+    LOCK_STRIPES = 64                  # Lock stripes for per-key memory (power of two)
+    
+    # Windows in monotonic nanoseconds, so window math is integer-only
+    _BRUTEFORCE_WINDOW_NS = BRUTEFORCE_WINDOW_SECONDS * _NS_PER_SECOND
+    _PORT_SCAN_WINDOW_NS = PORT_SCAN_WINDOW_SECONDS * _NS_PER_SECOND
+    _DDOS_WINDOW_NS = DDOS_WINDOW_SECONDS * _NS_PER_SECOND
+    _ROLE_CHANGE_RETENTION_NS = ROLE_CHANGE_RETENTION_SECONDS * _NS_PER_SECOND
+    _CLEANUP_INTERVAL_NS = CLEANUP_INTERVAL_SECONDS * _NS_PER_SECOND
+    
+    # Constant indicator text, formatted once
+    _BRUTEFORCE_WINDOW_LABEL = f"Window: {BRUTEFORCE_WINDOW_SECONDS}s"
+    _PORT_SCAN_WINDOW_LABEL = f"Window: {PORT_SCAN_WINDOW_SECONDS}s"
+    
+    # Confidence per failed-attempt count, indexed instead of recomputed
+    _BRUTEFORCE_CONFIDENCE = _bruteforce_confidence_table(
+        BRUTEFORCE_THRESHOLD, BRUTEFORCE_MAX_TRACKED
+    )
+    
+    __slots__ = (
+        "_locks",
+        "failed_login_memory",
+        "port_scan_times",
+        "port_scan_ports",
+        "port_scan_targets",
+        "port_counts",
+        "target_counts",
+        "traffic_times",
+        "traffic_bytes",
+        "traffic_window_bytes",
+        "role_change_memory",
+        "traffic_baseline",
+        "_ddos_threshold",
+        "_last_cleanup",
+        "_common_checks",
+        "_checks_by_type",
+        "_stateful_checks",
+    )
     
     def __init__(self):
-        # Thread-safe lock for concurrent access
-        self._lock = threading.Lock()
+        # Striped locks: each IP / user maps to one stripe, so events for
+        # different keys don't serialize on a single lock
+        self._locks = tuple(threading.Lock() for _ in range(self.LOCK_STRIPES))
         
         # Stateful memory windows
-        # Brute force: IP -> list of LoginAttempt
-        self.failed_login_memory: Dict[str, List[LoginAttempt]] = defaultdict(list)
-        
-        # Port scan: IP -> list of PortScanEvent
-        self.port_scan_memory: Dict[str, List[PortScanEvent]] = defaultdict(list)
-        
-        # DDoS: IP -> list of TrafficEvent
-        self.traffic_memory: Dict[str, List[TrafficEvent]] = defaultdict(list)
+        # Brute force: IP -> deque of (monotonic ns timestamp, username), oldest first
+        self.failed_login_memory: Dict[str, deque] = {}
+        
+        # Port scan: IP -> parallel deques of monotonic ns timestamp, port
+        # and destination IP, oldest first
+        self.port_scan_times: Dict[str, deque] = defaultdict(deque)
+        self.port_scan_ports: Dict[str, deque] = defaultdict(deque)
+        self.port_scan_targets: Dict[str, deque] = defaultdict(deque)
+        # Port scan: IP -> how often each port / target appears in the window
+        self.port_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.target_counts: Dict[str, Counter] = defaultdict(Counter)
+        
+        # DDoS: IP -> parallel deques of monotonic ns timestamp and bytes,
+        # oldest first, plus the running byte total of each window
+        self.traffic_times: Dict[str, deque] = defaultdict(deque)
+        self.traffic_bytes: Dict[str, deque] = defaultdict(deque)
+        self.traffic_window_bytes: Dict[str, float] = {}
         
         # Privilege escalation: user -> list of RoleChange
         self.role_change_memory: Dict[str, List[RoleChange]] = defaultdict(list)
         
         # Traffic baseline (adaptive)
         self.traffic_baseline: float = 1000.0  # bytes per event baseline
-        self.traffic_samples: int = 0
-        self.traffic_sum: float = 0.0
+        # Spike threshold, recomputed only when the baseline moves
+        self._ddos_threshold: float = self.traffic_baseline * self.DDOS_SPIKE_MULTIPLIER
         
-    def _cleanup_old_entries(self, cutoff: datetime):
-        """Remove entries older than cutoff from all memory windows"""
-        with self._lock:
+        # Monotonic time (ns) of the last full memory sweep
+        self._last_cleanup: int = 0
+        
+        # Detection rules per event type. SQL injection and privilege
+        # escalation look at details fields any event type can carry.
+        self._common_checks = (
+            self._check_sql_injection,
+            self._check_privilege_escalation,
+        )
+        self._checks_by_type = {
+            LOGIN_EVENT: (
+                self._check_bruteforce,
+                self._check_sql_injection,
+                self._check_privilege_escalation,
+            ),
+            NETWORK_EVENT: (
+                self._check_port_scan,
+                self._check_ddos,
+                self._check_sql_injection,
+                self._check_exfiltration,
+                self._check_privilege_escalation,
+                self._check_malicious_traffic,
+            ),
+            PROCESS_EVENT: (
+                self._check_malware,
+                self._check_sql_injection,
+                self._check_privilege_escalation,
+            ),
+        }
+        # Rules that record state from every event they see
+        self._stateful_checks = frozenset({
+            self._check_bruteforce,
+            self._check_port_scan,
+            self._check_ddos,
+            self._check_privilege_escalation,
+        })
+        
+    def _cleanup_old_entries(self):
+        """
+        Remove entries that fell out of their window from all memory windows.
+        Each check prunes the IP it looks at, so this sweep only reclaims
+        memory for idle keys and runs at most every CLEANUP_INTERVAL_SECONDS.
+        """
+        now = time.monotonic_ns()
+        if now - self._last_cleanup < self._CLEANUP_INTERVAL_NS:
+            return
+        # The sweep touches every key, so take every stripe (in a fixed order)
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._last_cleanup = now
+            
             # Clean brute force memory
+            login_cutoff = now - self._BRUTEFORCE_WINDOW_NS
             for ip in list(self.failed_login_memory.keys()):
-                self.failed_login_memory[ip] = [
-                    attempt for attempt in self.failed_login_memory[ip]
-                    if attempt.timestamp > cutoff
-                ]
-                if not self.failed_login_memory[ip]:
+                attempts = self.failed_login_memory[ip]
+                while attempts and attempts[0][0] <= login_cutoff:
+                    attempts.popleft()
+                if not attempts:
                     del self.failed_login_memory[ip]
             
             # Clean port scan memory
-            port_cutoff = datetime.utcnow() - timedelta(seconds=self.PORT_SCAN_WINDOW_SECONDS)
-            for ip in list(self.port_scan_memory.keys()):
-                self.port_scan_memory[ip] = [
-                    scan for scan in self.port_scan_memory[ip]
-                    if scan.timestamp > port_cutoff
-                ]
-                if not self.port_scan_memory[ip]:
-                    del self.port_scan_memory[ip]
+            port_cutoff = now - self._PORT_SCAN_WINDOW_NS
+            for ip in list(self.port_scan_times.keys()):
+                self._evict_port_scans(ip, port_cutoff)
             
             # Clean traffic memory
-            traffic_cutoff = datetime.utcnow() - timedelta(seconds=self.DDOS_WINDOW_SECONDS)
-            for ip in list(self.traffic_memory.keys()):
-                self.traffic_memory[ip] = [
-                    event for event in self.traffic_memory[ip]
-                    if event.timestamp > traffic_cutoff
+            traffic_cutoff = now - self._DDOS_WINDOW_NS
+            for ip in list(self.traffic_times.keys()):
+                self._evict_traffic(ip, traffic_cutoff)
+            
+            # Clean role change memory
+            role_cutoff = now - self._ROLE_CHANGE_RETENTION_NS
+            for user in list(self.role_change_memory.keys()):
+                self.role_change_memory[user] = [
+                    change for change in self.role_change_memory[user]
+                    if change.timestamp_ns > role_cutoff
                 ]
-                if not self.traffic_memory[ip]:
-                    del self.traffic_memory[ip]
+                if not self.role_change_memory[user]:
+                    del self.role_change_memory[user]
+            
+            # Past the key cap, forget the longest-tracked keys first
+            for ip in self._excess_keys(self.failed_login_memory):
+                del self.failed_login_memory[ip]
+            for ip in self._excess_keys(self.port_scan_times):
+                self._evict_port_scans(ip, now)
+            for ip in self._excess_keys(self.traffic_times):
+                self._evict_traffic(ip, now)
+            for user in self._excess_keys(self.role_change_memory):
+                del self.role_change_memory[user]
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+    
+    def _excess_keys(self, memory: Dict[str, Any]) -> List[str]:
+        """Oldest-inserted keys beyond MAX_TRACKED_KEYS"""
+        excess = len(memory) - self.MAX_TRACKED_KEYS
+        return list(islice(memory, excess)) if excess > 0 else []
+    
+    def _lock_for(self, key: str) -> threading.Lock:
+        """Lock stripe guarding a key's memory windows"""
+        return self._locks[hash(key) & (self.LOCK_STRIPES - 1)]
+    
+    def _evict_port_scans(self, ip: str, cutoff: int):
+        """
+        Drop an IP's port scans older than cutoff, and the oldest beyond
+        WINDOW_MAX_TRACKED, keeping its counters in step (caller holds the IP's stripe)
+        """
+        times = self.port_scan_times[ip]
+        ports = self.port_scan_ports[ip]
+        targets = self.port_scan_targets[ip]
+        port_counts = self.port_counts[ip]
+        target_counts = self.target_counts[ip]
+        max_tracked = self.WINDOW_MAX_TRACKED
+        while times and (times[0] <= cutoff or len(times) > max_tracked):
+            times.popleft()
+            port = ports.popleft()
+            target = targets.popleft()
+            port_counts[port] -= 1
+            if not port_counts[port]:
+                del port_counts[port]
+            target_counts[target] -= 1
+            if not target_counts[target]:
+                del target_counts[target]
+        if not times:
+            del self.port_scan_times[ip]
+            del self.port_scan_ports[ip]
+            del self.port_scan_targets[ip]
+            del self.port_counts[ip]
+            del self.target_counts[ip]
+    
+    def _evict_traffic(self, ip: str, cutoff: int):
+        """
+        Drop an IP's traffic older than cutoff, and the oldest beyond
+        WINDOW_MAX_TRACKED, keeping its byte total in step (caller holds the IP's stripe)
+        """
+        times = self.traffic_times[ip]
+        volumes = self.traffic_bytes[ip]
+        total = self.traffic_window_bytes.get(ip, 0)
+        max_tracked = self.WINDOW_MAX_TRACKED
+        while times and (times[0] <= cutoff or len(times) > max_tracked):
+            times.popleft()
+            total -= volumes.popleft()
+        if times:
+            self.traffic_window_bytes[ip] = total
+        else:
+            del self.traffic_times[ip]
+            del self.traffic_bytes[ip]
+            self.traffic_window_bytes.pop(ip, None)
     
     def analyze_event(
         self,
@@ -223,40 +511,30 @@ class DetectionEngine:
         source_ip = event.get("source_ip", "")
         
         # Periodic cleanup of old entries
-        now = datetime.utcnow()
-        cutoff = now - timedelta(seconds=max(
-            self.BRUTEFORCE_WINDOW_SECONDS,
-            self.PORT_SCAN_WINDOW_SECONDS,
-            self.DDOS_WINDOW_SECONDS
-        ))
-        self._cleanup_old_entries(cutoff)
-        
-        # Check each detection rule
-        checks = [
-            self._check_bruteforce(event, source_ip, details),
-            self._check_port_scan(event, source_ip, details),
-            self._check_malware(event, details),
-            self._check_ddos(event, source_ip, details),
-            self._check_sql_injection(event, details),
-            self._check_exfiltration(event, details),
-            self._check_privilege_escalation(event, details),
-            self._check_malicious_traffic(event, details),
-        ]
-        
-        # Return highest severity threat detected
-        threats = [result for result in checks if result.is_threat]
-        if threats:
-            # Sort by severity (critical > high > medium > low)
-            severity_order = {Severity.CRITICAL: 0, Severity.HIGH: 1, Severity.MEDIUM: 2, Severity.LOW: 3}
-            threats.sort(key=lambda x: severity_order.get(x.severity, 4))
+        self._cleanup_old_entries()
+        
+        # Run only the rules that apply to this event type
+        checks = self._checks_by_type.get(event_type, self._common_checks)
+        threats = []
+        for i, check in enumerate(checks):
+            result = check(event, source_ip, details)
+            if not result.is_threat:
+                continue
+            if result.severity is Severity.CRITICAL:
+                # Nothing outranks the first critical hit; later rules only
+                # need to run if they keep per-event state
+                for later in checks[i + 1:]:
+                    if later in self._stateful_checks:
+                        later(event, source_ip, details)
+                return result
+            threats.append(result)
+        
+        # Return highest severity threat detected (earliest rule wins ties)
+        if not threats:
+            return _NO_THREATS_DETECTED
+        if len(threats) == 1:
             return threats[0]
-        
-        return DetectionResult(
-            is_threat=False,
-            threat_type=None,
-            severity=None,
-            description="No threats detected"
-        )
+        return min(threats, key=lambda x: _SEVERITY_ORDER.get(x.severity, 4))
     
     def _check_bruteforce(
         self,
@@ -268,32 +546,32 @@ class DetectionEngine:
         Check for brute force attacks using sliding window memory.
         Triggers when >5 failed logins in 30 seconds from same IP.
         """
-        if event.get("type") != "login_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
         success = details.get("success", True)
         username = details.get("username", "unknown")
-        now = datetime.utcnow()
+        now = time.monotonic_ns()
         
         # Track this attempt in memory
-        with self._lock:
+        with self._lock_for(source_ip):
+            # Successful logins from untracked IPs don't get a window
+            attempts = self.failed_login_memory.get(source_ip)
+            if attempts is None:
+                if success:
+                    return _NO_THREAT
+                attempts = self.failed_login_memory[source_ip] = deque(
+                    maxlen=self.BRUTEFORCE_MAX_TRACKED
+                )
             if not success:
-                self.failed_login_memory[source_ip].append(LoginAttempt(
-                    timestamp=now,
-                    username=username,
-                    success=False
-                ))
+                attempts.append((now, username))
             
-            # Clean old entries for this IP
-            cutoff = now - timedelta(seconds=self.BRUTEFORCE_WINDOW_SECONDS)
-            self.failed_login_memory[source_ip] = [
-                attempt for attempt in self.failed_login_memory[source_ip]
-                if attempt.timestamp > cutoff
-            ]
+            # Evict attempts that fell out of the window (oldest first)
+            cutoff = now - self._BRUTEFORCE_WINDOW_NS
+            while attempts and attempts[0][0] <= cutoff:
+                attempts.popleft()
             
-            # Count failed attempts
-            failed_count = len(self.failed_login_memory[source_ip])
-            targeted_users = set(a.username for a in self.failed_login_memory[source_ip])
+            # Count failed attempts; usernames are only gathered for a report
+            failed_count = len(attempts)
+            if failed_count > self.BRUTEFORCE_THRESHOLD:
+                targeted_users = set(user for _, user in attempts)
         
         if failed_count > self.BRUTEFORCE_THRESHOLD:
             return DetectionResult(
@@ -301,16 +579,16 @@ class DetectionEngine:
                 threat_type=ThreatType.BRUTEFORCE,
                 severity=Severity.HIGH if failed_count < 10 else Severity.CRITICAL,
                 description=f"Brute force attack detected: {failed_count} failed login attempts in {self.BRUTEFORCE_WINDOW_SECONDS} seconds",
-                confidence=min(0.95, 0.5 + (failed_count - self.BRUTEFORCE_THRESHOLD) * 0.1),
-                indicators=[
+                confidence=self._BRUTEFORCE_CONFIDENCE[min(failed_count, self.BRUTEFORCE_MAX_TRACKED)],
+                indicators=(
                     f"Source IP: {source_ip}",
                     f"Failed attempts: {failed_count}",
-                    f"Window: {self.BRUTEFORCE_WINDOW_SECONDS}s",
+                    self._BRUTEFORCE_WINDOW_LABEL,
                     f"Targeted users: {', '.join(list(targeted_users)[:5])}"
-                ]
+                )
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
     def _check_port_scan(
         self,
@@ -322,71 +600,68 @@ class DetectionEngine:
         Check for port scanning using sliding window memory.
         Triggers when >10 unique ports scanned in 60 seconds from same IP.
         """
-        if event.get("type") != "network_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
         port = details.get("port")
         dest_ip = details.get("destination_ip", "")
         flags = details.get("flags", "")
         
         # Only track SYN or connection attempts
         if not port:
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+            return _NO_THREAT
         
-        now = datetime.utcnow()
+        now = time.monotonic_ns()
         
-        with self._lock:
+        with self._lock_for(source_ip):
             # Track this port scan
-            self.port_scan_memory[source_ip].append(PortScanEvent(
-                timestamp=now,
-                port=port,
-                destination_ip=dest_ip
-            ))
+            self.port_scan_times[source_ip].append(now)
+            self.port_scan_ports[source_ip].append(port)
+            self.port_scan_targets[source_ip].append(dest_ip)
+            port_counts = self.port_counts[source_ip]
+            target_counts = self.target_counts[source_ip]
+            port_counts[port] += 1
+            target_counts[dest_ip] += 1
             
-            # Clean old entries
-            cutoff = now - timedelta(seconds=self.PORT_SCAN_WINDOW_SECONDS)
-            self.port_scan_memory[source_ip] = [
-                scan for scan in self.port_scan_memory[source_ip]
-                if scan.timestamp > cutoff
-            ]
+            # Evict scans that fell out of the window or exceed the cap
+            self._evict_port_scans(source_ip, now - self._PORT_SCAN_WINDOW_NS)
             
-            # Count unique ports
-            unique_ports = set(scan.port for scan in self.port_scan_memory[source_ip])
-            unique_targets = set(scan.destination_ip for scan in self.port_scan_memory[source_ip])
+            # Unique ports are the counter's keys
+            port_count = len(port_counts)
+            if port_count > self.PORT_SCAN_THRESHOLD:
+                unique_ports = set(port_counts)
+                unique_targets = set(target_counts)
         
-        if len(unique_ports) > self.PORT_SCAN_THRESHOLD:
+        if port_count > self.PORT_SCAN_THRESHOLD:
             return DetectionResult(
                 is_threat=True,
                 threat_type=ThreatType.PORT_SCAN,
                 severity=Severity.HIGH,
                 description=f"Port scan detected: {len(unique_ports)} unique ports scanned in {self.PORT_SCAN_WINDOW_SECONDS} seconds",
                 confidence=min(0.9, 0.5 + (len(unique_ports) - self.PORT_SCAN_THRESHOLD) * 0.05),
-                indicators=[
+                indicators=(
                     f"Source IP: {source_ip}",
                     f"Unique ports: {len(unique_ports)}",
-                    f"Window: {self.PORT_SCAN_WINDOW_SECONDS}s",
+                    self._PORT_SCAN_WINDOW_LABEL,
                     f"Target IPs: {', '.join(list(unique_targets)[:3])}",
                     f"Sample ports: {', '.join(str(p) for p in list(unique_ports)[:10])}"
-                ]
+                )
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
-    def _check_malware(self, event: Dict, details: Dict) -> DetectionResult:
+    def _check_malware(
+        self,
+        event: Dict,
+        source_ip: str,
+        details: Dict
+    ) -> DetectionResult:
         """Check for malware indicators"""
-        if event.get("type") != "process_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
-        process_name = details.get("process_name", "").lower()
+        process_name = details.get("process_name", "")
         process_hash = details.get("hash", "")
         
         indicators = []
         
-        # Check for suspicious process names
-        for suspicious in SUSPICIOUS_PROCESSES:
-            if suspicious in process_name:
-                indicators.append(f"Suspicious process: {process_name}")
-                break
+        # Check for suspicious process names (lowercased only for the report)
+        if _SUSPICIOUS_PROCESS_RE.search(process_name):
+            indicators.append(f"Suspicious process: {process_name.lower()}")
         
         # Check for known malicious hashes
         if process_hash in MALICIOUS_HASHES:
@@ -399,10 +674,10 @@ class DetectionEngine:
                 severity=Severity.CRITICAL,
                 description="Malware detected: suspicious process or known malicious hash",
                 confidence=0.9,
-                indicators=indicators
+                indicators=tuple(indicators)
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
     def _check_ddos(
         self,
@@ -415,40 +690,34 @@ class DetectionEngine:
         Triggers when traffic > baseline * DDOS_SPIKE_MULTIPLIER.
         Updates adaptive baseline with normal traffic.
         """
-        if event.get("type") != "network_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
         traffic_volume = details.get("bytes", 0)
-        now = datetime.utcnow()
+        now = time.monotonic_ns()
         
-        with self._lock:
+        with self._lock_for(source_ip):
             # Track this traffic event
-            self.traffic_memory[source_ip].append(TrafficEvent(
-                timestamp=now,
-                bytes=traffic_volume,
-                source_ip=source_ip
-            ))
+            self.traffic_times[source_ip].append(now)
+            self.traffic_bytes[source_ip].append(traffic_volume)
+            self.traffic_window_bytes[source_ip] = (
+                self.traffic_window_bytes.get(source_ip, 0) + traffic_volume
+            )
             
-            # Clean old entries
-            cutoff = now - timedelta(seconds=self.DDOS_WINDOW_SECONDS)
-            self.traffic_memory[source_ip] = [
-                event for event in self.traffic_memory[source_ip]
-                if event.timestamp > cutoff
-            ]
+            # Evict traffic that fell out of the window or exceeds the cap
+            self._evict_traffic(source_ip, now - self._DDOS_WINDOW_NS)
             
-            # Calculate traffic in window
-            window_traffic = sum(e.bytes for e in self.traffic_memory[source_ip])
-            event_count = len(self.traffic_memory[source_ip])
+            # Traffic in window
+            window_traffic = self.traffic_window_bytes.get(source_ip, 0)
+            event_count = len(self.traffic_times.get(source_ip, ()))
         
         # Update adaptive baseline for normal traffic
-        threshold = self.traffic_baseline * self.DDOS_SPIKE_MULTIPLIER
+        threshold = self._ddos_threshold
         
         if traffic_volume < threshold:
-            # Update baseline with exponential moving average
-            self.traffic_samples += 1
-            self.traffic_sum += traffic_volume
-            if self.traffic_samples > 10:
-                self.traffic_baseline = self.traffic_sum / self.traffic_samples
+            # Update baseline with exponential moving average; single
+            # attribute stores, so concurrent updates can't tear either value
+            alpha = self.DDOS_BASELINE_ALPHA
+            baseline = (1 - alpha) * self.traffic_baseline + alpha * traffic_volume
+            self.traffic_baseline = baseline
+            self._ddos_threshold = baseline * self.DDOS_SPIKE_MULTIPLIER
         
         # Check for spike
         if traffic_volume > threshold or (event_count > 5 and window_traffic > threshold * event_count):
@@ -458,72 +727,83 @@ class DetectionEngine:
                 severity=Severity.CRITICAL,
                 description=f"DDoS attack detected: traffic volume {traffic_volume} bytes exceeds threshold ({threshold:.0f} bytes)",
                 confidence=0.85,
-                indicators=[
+                indicators=(
                     f"Traffic volume: {traffic_volume} bytes",
                     f"Baseline: {self.traffic_baseline:.0f} bytes",
                     f"Multiplier: {traffic_volume / self.traffic_baseline:.1f}x",
                     f"Window traffic: {window_traffic} bytes in {self.DDOS_WINDOW_SECONDS}s",
                     f"Source IP: {source_ip}"
-                ]
+                )
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
-    def _check_sql_injection(self, event: Dict, details: Dict) -> DetectionResult:
+    def _check_sql_injection(
+        self,
+        event: Dict,
+        source_ip: str,
+        details: Dict
+    ) -> DetectionResult:
         """Check for SQL injection patterns"""
-        # Check command field or any string in details
-        check_strings = [
+        # Only the fields that carry user-supplied SQL/commands are scanned
+        check_strings = (
             details.get("command", ""),
             details.get("request_payload", ""),
             details.get("query", ""),
-            str(details)
-        ]
+        )
         
         for check_str in check_strings:
-            for pattern in SQLI_PATTERNS:
-                if pattern.upper() in check_str.upper():
-                    return DetectionResult(
-                        is_threat=True,
-                        threat_type=ThreatType.SQL_INJECTION,
-                        severity=Severity.HIGH,
-                        description=f"SQL injection attempt detected: found pattern '{pattern}'",
-                        confidence=0.88,
-                        indicators=[
-                            f"Pattern matched: {pattern}",
-                            f"Source: {event.get('source_ip', 'unknown')}"
-                        ]
+            if not check_str:
+                continue
+            pattern = _sqli_match(check_str)
+            if pattern:
+                return DetectionResult(
+                    is_threat=True,
+                    threat_type=ThreatType.SQL_INJECTION,
+                    severity=Severity.HIGH,
+                    description=f"SQL injection attempt detected: found pattern '{pattern}'",
+                    confidence=0.88,
+                    indicators=(
+                        f"Pattern matched: {pattern}",
+                        f"Source: {event.get('source_ip', 'unknown')}"
                     )
+                )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
-    def _check_exfiltration(self, event: Dict, details: Dict) -> DetectionResult:
+    def _check_exfiltration(
+        self,
+        event: Dict,
+        source_ip: str,
+        details: Dict
+    ) -> DetectionResult:
         """Check for data exfiltration: large outbound data transfers"""
-        if event.get("type") != "network_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
         outbound_bytes = details.get("bytes", 0)
         dest_ip = details.get("destination_ip", "")
         
         # Threshold for suspicious data transfer (50KB in single event)
-        EXFIL_THRESHOLD = 50000
-        
-        if outbound_bytes > EXFIL_THRESHOLD:
+        if outbound_bytes > self.EXFIL_THRESHOLD_BYTES:
             return DetectionResult(
                 is_threat=True,
                 threat_type=ThreatType.EXFILTRATION,
                 severity=Severity.HIGH,
                 description=f"Potential data exfiltration: {outbound_bytes} bytes transferred to {dest_ip}",
                 confidence=0.75,
-                indicators=[
+                indicators=(
                     f"Outbound bytes: {outbound_bytes}",
                     f"Destination: {dest_ip}",
                     "Exceeds normal transfer threshold"
-                ]
+                )
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
-    def _check_privilege_escalation(self, event: Dict, details: Dict) -> DetectionResult:
+    def _check_privilege_escalation(
+        self,
+        event: Dict,
+        source_ip: str,
+        details: Dict
+    ) -> DetectionResult:
         """
         Check for privilege escalation attempts.
         Detects role changes to privileged accounts and elevation tools.
@@ -535,31 +815,32 @@ class DetectionEngine:
         user_change = details.get("user_change", "")
         action = details.get("action", "")
         
-        # Parse role change (format: "user -> root")
-        if "->" in user_change:
-            parts = user_change.split("->")
-            if len(parts) == 2:
-                from_role = parts[0].strip().lower()
-                to_role = parts[1].strip().lower()
-                user = details.get("user", "unknown")
-                
-                # Track role change in memory
-                now = datetime.utcnow()
-                with self._lock:
-                    self.role_change_memory[user].append(RoleChange(
-                        timestamp=now,
-                        from_role=from_role,
-                        to_role=to_role,
-                        user=user
-                    ))
-                
-                # Check if escalating to privileged role
-                for priv_role in PRIVILEGED_ROLES:
-                    if priv_role in to_role and priv_role not in from_role:
-                        indicators.append(f"Role change: {user_change}")
-                        indicators.append(f"Escalated to privileged role: {to_role}")
-                        severity = Severity.CRITICAL
-                        break
+        # Parse role change (format: "user -> root"); exactly one arrow, and
+        # partition avoids building a list per event
+        from_part, arrow, to_part = user_change.partition("->")
+        if arrow and "->" not in to_part:
+            from_role = from_part.strip().lower()
+            to_role = to_part.strip().lower()
+            user = details.get("user", "unknown")
+            
+            # Track role change in memory
+            now = time.monotonic_ns()
+            with self._lock_for(user):
+                self.role_change_memory[user].append(RoleChange(
+                    timestamp_ns=now,
+                    from_role=from_role,
+                    to_role=to_role,
+                    user=user
+                ))
+            
+            # Check if escalating to privileged role
+            if any(
+                priv_role in to_role and priv_role not in from_role
+                for priv_role in PRIVILEGED_ROLES
+            ):
+                indicators.append(f"Role change: {user_change}")
+                indicators.append(f"Escalated to privileged role: {to_role}")
+                severity = Severity.CRITICAL
         
         # Check for role_change action type
         if action == "role_change":
@@ -568,11 +849,10 @@ class DetectionEngine:
                 severity = Severity.HIGH
         
         # Check for sudo or elevation processes
-        if event.get("type") == "process_event":
+        if event.get("type") == PROCESS_EVENT:
             process_name = details.get("process_name", "").lower()
-            elevation_tools = ["sudo", "su", "doas", "pkexec", "runas", "gsudo", "elevate"]
             
-            if process_name in elevation_tools:
+            if process_name in ELEVATION_TOOLS:
                 indicators.append(f"Elevation tool executed: {process_name}")
                 indicators.append(f"PID: {details.get('pid', 'unknown')}")
                 command_line = details.get("command_line", "")
@@ -588,33 +868,36 @@ class DetectionEngine:
                 severity=severity or Severity.HIGH,
                 description=f"Privilege escalation detected: {indicators[0]}",
                 confidence=0.92 if severity == Severity.CRITICAL else 0.7,
-                indicators=indicators
+                indicators=tuple(indicators)
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
     
-    def _check_malicious_traffic(self, event: Dict, details: Dict) -> DetectionResult:
+    def _check_malicious_traffic(
+        self,
+        event: Dict,
+        source_ip: str,
+        details: Dict
+    ) -> DetectionResult:
         """Check for traffic to known malicious IPs"""
-        if event.get("type") != "network_event":
-            return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
-        
         dest_ip = details.get("destination_ip", "")
         
-        if dest_ip in BLACKLIST_IPS:
+        # Exact IPs first; ranges only need checking for the rest
+        if dest_ip in BLACKLIST_IPS or _in_blacklisted_network(dest_ip):
             return DetectionResult(
                 is_threat=True,
                 threat_type=ThreatType.MALICIOUS_TRAFFIC,
                 severity=Severity.CRITICAL,
                 description=f"Communication with known malicious IP: {dest_ip}",
                 confidence=0.95,
-                indicators=[
+                indicators=(
                     f"Blacklisted IP: {dest_ip}",
                     f"Port: {details.get('port', 'unknown')}",
                     f"Protocol: {details.get('protocol', 'unknown')}"
-                ]
+                )
             )
         
-        return DetectionResult(is_threat=False, threat_type=None, severity=None, description="")
+        return _NO_THREAT
 
 
 # Global detection engine instance
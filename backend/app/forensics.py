@@ -5,12 +5,28 @@ System forensics capture using psutil and mock packet data
 DEMO MODE: Returns hardcoded data when enabled
 """
 
+import asyncio
 import psutil
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
 import random
-import hashlib
+import heapq
+import secrets
+import time
+from types import MappingProxyType
+
+# orjson is a much faster encoder; fall back to stdlib json if unavailable
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pwd only exists on POSIX
+try:
+    import pwd
+except ImportError:
+    pwd = None
 
 # Import demo mode config
 try:
@@ -20,6 +36,144 @@ except ImportError:
     DEMO_FORENSIC_REPORT = {}
 
 
+# Prime psutil's CPU sampler so non-blocking cpu_percent() calls return the
+# usage since the previous call instead of sleeping for a sample interval
+try:
+    psutil.cpu_percent(interval=None)
+except Exception as e:
+    print(f"[FORENSICS] CPU sampler init failed: {e}")
+
+# Per-process fields captured in snapshots. psutil's 'username' does a passwd
+# lookup for every process; on POSIX we read the real UID instead and resolve
+# names (only for the processes we report) through a per-engine cache.
+PROCESS_ATTRS = [
+    'pid', 'name', 'uids' if pwd is not None else 'username',
+    'cpu_percent', 'memory_percent', 'status', 'create_time'
+]
+
+# Value pools for mock packet captures
+MOCK_PROTOCOLS = ("TCP", "UDP", "ICMP")
+MOCK_FLAGS = ("SYN", "SYN-ACK", "ACK", "FIN", "RST", "PSH")
+MOCK_PORTS = (22, 80, 443, 3306, 8080)
+MOCK_TTLS = (64, 128, 255)
+
+# Mock packet payload previews per threat type
+PAYLOAD_PREVIEWS = MappingProxyType({
+    "bruteforce": "[AUTH] Failed password for admin from 192.168.1.x port 52341 ssh2",
+    "malware": "[BINARY] MZ\\x90\\x00\\x03\\x00\\x00\\x00...PE signature detected",
+    "ddos": "[FLOOD] GET / HTTP/1.1\\r\\nHost: target.com\\r\\nUser-Agent: [RANDOMIZED]",
+    "sql_injection": "[SQL] SELECT * FROM users WHERE id='1' OR '1'='1'--",
+    "exfiltration": "[DATA] POST /upload HTTP/1.1\\r\\nContent-Length: 524288\\r\\n[ENCRYPTED]",
+    "privilege_escalation": "[SUDO] user : TTY=pts/0 ; PWD=/home/user ; USER=root ; COMMAND=/bin/bash",
+    "malicious_traffic": "[C2] BEACON: id=0x4A2B status=ACTIVE interval=60s",
+})
+
+# Remediation steps per threat type, plus the defaults and common steps
+THREAT_RECOMMENDATIONS = MappingProxyType({
+    "bruteforce": (
+        "Block source IP at firewall level",
+        "Force password reset for targeted accounts",
+        "Enable account lockout policy",
+        "Implement multi-factor authentication",
+        "Review authentication logs for successful compromise"
+    ),
+    "malware": (
+        "Isolate affected system immediately",
+        "Kill malicious process and quarantine files",
+        "Run full antivirus/EDR scan",
+        "Check for persistence mechanisms",
+        "Scan network for lateral movement indicators"
+    ),
+    "ddos": (
+        "Enable rate limiting on affected services",
+        "Activate CDN/DDoS protection services",
+        "Block attacking IP ranges at edge",
+        "Scale infrastructure if possible",
+        "Contact ISP for upstream filtering"
+    ),
+    "sql_injection": (
+        "Block source IP immediately",
+        "Review database for unauthorized changes",
+        "Check for data exfiltration",
+        "Patch vulnerable application",
+        "Implement Web Application Firewall (WAF) rules"
+    ),
+    "exfiltration": (
+        "Block destination IP and domain",
+        "Identify scope of data potentially leaked",
+        "Preserve logs for forensic analysis",
+        "Notify security leadership immediately",
+        "Prepare for potential breach disclosure"
+    ),
+    "privilege_escalation": (
+        "Revoke elevated privileges immediately",
+        "Reset all affected user credentials",
+        "Audit recent admin actions",
+        "Check for unauthorized changes to system files",
+        "Review sudo/admin group memberships"
+    ),
+    "malicious_traffic": (
+        "Block C2 IP/domain at DNS and firewall",
+        "Isolate infected host from network",
+        "Scan for additional compromised systems",
+        "Check for beaconing patterns in proxy logs",
+        "Identify initial infection vector"
+    )
+})
+
+DEFAULT_RECOMMENDATIONS = (
+    "Investigate event source and context",
+    "Check for related suspicious activity",
+    "Escalate if severity is high or critical",
+    "Monitor for recurrence"
+)
+
+BASE_RECOMMENDATIONS = (
+    "Document all findings for incident report",
+    "Review related logs for additional context",
+    "Update incident response runbook if needed"
+)
+
+
+# Snapshot lists stored both as their own JSONB columns and inside forensic_data
+SNAPSHOT_LIST_COLUMNS = ("processes", "connections", "packet_data")
+
+# Most entries of each list kept in a stored report
+SNAPSHOT_LIST_LIMIT = 50
+
+
+def _json_dumps(value: Any) -> str:
+    """Serialize a value to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def serialize_snapshot(
+    snapshot: Dict[str, Any],
+    encoded: Optional[Dict[str, str]] = None
+) -> Dict[str, str]:
+    """
+    JSON-encode a snapshot for the forensic_reports row.
+    Each list column is encoded once and spliced into forensic_data rather
+    than being serialized a second time; `encoded` supplies columns that are
+    already serialized (e.g. the demo constants). Lists are capped at
+    SNAPSHOT_LIST_LIMIT entries.
+    """
+    columns = dict(encoded or {})
+    for key in SNAPSHOT_LIST_COLUMNS:
+        if key not in columns:
+            # Truncate before encoding so oversized lists never get serialized
+            columns[key] = _json_dumps(snapshot.get(key, [])[:SNAPSHOT_LIST_LIMIT])
+    
+    rest = _json_dumps({k: v for k, v in snapshot.items() if k not in SNAPSHOT_LIST_COLUMNS})
+    spliced = [f'"{key}":{columns[key]}' for key in SNAPSHOT_LIST_COLUMNS if key in snapshot]
+    if len(rest) > 2:
+        spliced.append(rest[1:-1])
+    columns["forensic_data"] = "{" + ",".join(spliced) + "}"
+    return columns
+
+
 class ForensicsEngine:
     """
     Captures system forensic snapshots for incident investigation.
@@ -28,8 +182,13 @@ class ForensicsEngine:
     
     def __init__(self):
         self.capture_count = 0
+        # Boot time never changes while we run; read it once (lazily)
+        self._boot_ts: Optional[float] = None
+        self._boot_iso: Optional[str] = None
+        # real UID -> user name
+        self._uid_names: Dict[int, str] = {}
     
-    def capture_snapshot(
+    async def capture_snapshot(
         self,
         event: Dict[str, Any],
         incident_info: Dict[str, Any]
@@ -37,12 +196,15 @@ class ForensicsEngine:
         """
         Capture a complete forensic snapshot for an incident.
         Includes processes, network connections, and mock packet data.
+        The blocking psutil collectors run concurrently in worker threads.
         """
+        now_iso = datetime.utcnow().isoformat()
+        
         # DEMO MODE: Return hardcoded forensic data
         if DEMO_MODE:
             return {
-                "snapshot_id": hashlib.md5(f"{datetime.utcnow().isoformat()}".encode()).hexdigest()[:16],
-                "captured_at": datetime.utcnow().isoformat(),
+                "snapshot_id": secrets.token_hex(8),
+                "captured_at": now_iso,
                 "incident_type": incident_info.get("threat_type", "unknown"),
                 "system_info": DEMO_FORENSIC_REPORT.get("system_info", {}),
                 "processes": DEMO_FORENSIC_REPORT.get("processes", []),
@@ -62,15 +224,19 @@ class ForensicsEngine:
         
         self.capture_count += 1
         
+        system_info, processes, connections = await asyncio.gather(
+            asyncio.to_thread(self._get_system_info),
+            asyncio.to_thread(self._get_processes),
+            asyncio.to_thread(self._get_network_connections)
+        )
+        
         snapshot = {
-            "snapshot_id": hashlib.md5(
-                f"{datetime.utcnow().isoformat()}{self.capture_count}".encode()
-            ).hexdigest()[:16],
-            "captured_at": datetime.utcnow().isoformat(),
+            "snapshot_id": secrets.token_hex(8),
+            "captured_at": now_iso,
             "incident_type": incident_info.get("threat_type", "unknown"),
-            "system_info": self._get_system_info(),
-            "processes": self._get_processes(),
-            "connections": self._get_network_connections(),
+            "system_info": system_info,
+            "processes": processes,
+            "connections": connections,
             "packet_data": self._generate_mock_packets(event, incident_info),
             "suspicious_indicators": self._extract_indicators(event, incident_info),
             "recommended_actions": self._generate_recommendations(incident_info),
@@ -87,10 +253,12 @@ class ForensicsEngine:
     def _get_system_info(self) -> Dict[str, Any]:
         """Get current system information"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
+            cpu_percent = psutil.cpu_percent(interval=None)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage("/")
-            boot_time = datetime.fromtimestamp(psutil.boot_time())
+            if self._boot_ts is None:
+                self._boot_ts = psutil.boot_time()
+                self._boot_iso = datetime.fromtimestamp(self._boot_ts).isoformat()
             
             return {
                 "cpu_percent": round(cpu_percent, 2),
@@ -99,43 +267,73 @@ class ForensicsEngine:
                 "memory_available_gb": round(memory.available / (1024**3), 2),
                 "disk_percent": round(disk.percent, 2),
                 "disk_total_gb": round(disk.total / (1024**3), 2),
-                "boot_time": boot_time.isoformat(),
-                "uptime_hours": round((datetime.now() - boot_time).total_seconds() / 3600, 2)
+                "boot_time": self._boot_iso,
+                "uptime_hours": round((time.time() - self._boot_ts) / 3600, 2)
             }
         except Exception as e:
             return {"error": str(e)}
     
     def _get_processes(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get list of running processes sorted by CPU usage"""
-        processes = []
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'username', 'cpu_percent', 'memory_percent', 'status', 'create_time']):
-                try:
-                    pinfo = proc.info
-                    processes.append({
-                        "pid": pinfo.get('pid'),
-                        "name": pinfo.get('name'),
-                        "username": pinfo.get('username'),
-                        "cpu_percent": round(pinfo.get('cpu_percent', 0), 2),
-                        "memory_percent": round(pinfo.get('memory_percent', 0), 2),
-                        "status": pinfo.get('status'),
-                        "created": datetime.fromtimestamp(pinfo.get('create_time', 0)).isoformat() if pinfo.get('create_time') else None
-                    })
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
-            
-            # Sort by CPU and return top processes
-            processes.sort(key=lambda x: x.get('cpu_percent', 0), reverse=True)
-            return processes[:limit]
+            # Keep only the top processes by CPU (O(n log k), no full sort)
+            top = heapq.nlargest(
+                limit,
+                self._iter_process_info(),
+                key=lambda x: x.get('cpu_percent') or 0
+            )
+            return [
+                {
+                    "pid": pinfo.get('pid'),
+                    "name": pinfo.get('name'),
+                    "username": self._username(pinfo),
+                    "cpu_percent": round(pinfo.get('cpu_percent') or 0, 2),
+                    "memory_percent": round(pinfo.get('memory_percent') or 0, 2),
+                    "status": pinfo.get('status'),
+                    "created": datetime.fromtimestamp(pinfo['create_time']).isoformat() if pinfo.get('create_time') else None
+                }
+                for pinfo in top
+            ]
             
         except Exception as e:
             return [{"error": str(e)}]
     
+    def _username(self, pinfo: Dict[str, Any]) -> Optional[str]:
+        """Owner name for a process_iter record (from 'username' or cached UID lookup)"""
+        if 'username' in pinfo:
+            return pinfo['username']
+        uids = pinfo.get('uids')
+        if uids is None:
+            return None
+        uid = uids.real
+        name = self._uid_names.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                # Same fallback psutil uses for UIDs with no passwd entry
+                name = str(uid)
+            self._uid_names[uid] = name
+        return name
+    
+    def _iter_process_info(self):
+        """Yield raw attribute dicts for every accessible process"""
+        for proc in psutil.process_iter():
+            try:
+                pinfo = proc.as_dict(attrs=PROCESS_ATTRS)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            yield pinfo
+    
     def _get_network_connections(self, limit: int = 15) -> List[Dict[str, Any]]:
         """Get active network connections"""
         connections = []
+        pid_names: Dict[int, str] = {}
         try:
             for conn in psutil.net_connections(kind='inet'):
+                # Only the first `limit` connections are reported
+                if len(connections) >= limit:
+                    break
                 try:
                     conn_info = {
                         "family": "IPv4" if conn.family.name == "AF_INET" else "IPv6",
@@ -146,19 +344,20 @@ class ForensicsEngine:
                         "pid": conn.pid
                     }
                     
-                    # Try to get process name
+                    # Try to get process name (looked up once per PID)
                     if conn.pid:
-                        try:
-                            proc = psutil.Process(conn.pid)
-                            conn_info["process_name"] = proc.name()
-                        except:
-                            conn_info["process_name"] = "unknown"
+                        if conn.pid not in pid_names:
+                            try:
+                                pid_names[conn.pid] = psutil.Process(conn.pid).name()
+                            except:
+                                pid_names[conn.pid] = "unknown"
+                        conn_info["process_name"] = pid_names[conn.pid]
                     
                     connections.append(conn_info)
                 except:
                     pass
             
-            return connections[:limit]
+            return connections
             
         except Exception as e:
             return [{"error": str(e)}]
@@ -170,42 +369,43 @@ class ForensicsEngine:
         count: int = 5
     ) -> List[Dict[str, Any]]:
         """Generate mock packet capture data for the incident"""
-        packets = []
         details = event.get("details", {})
         
-        protocols = ["TCP", "UDP", "ICMP"]
-        flags = ["SYN", "SYN-ACK", "ACK", "FIN", "RST", "PSH"]
+        # Fields shared by every packet
+        timestamp = datetime.utcnow().isoformat()
+        source_ip = event.get("source_ip", "192.168.1.1")
+        destination_ip = details.get("destination_ip", "10.0.0.1")
+        payload_preview = self._generate_payload_preview(incident_info.get("threat_type", ""))
         
-        for i in range(count):
-            packet = {
+        # Draw each random column for the whole batch at once
+        ports = (details["port"],) * count if "port" in details else random.choices(MOCK_PORTS, k=count)
+        protocols = (details["protocol"],) * count if "protocol" in details else random.choices(MOCK_PROTOCOLS, k=count)
+        
+        return [
+            {
                 "sequence": i + 1,
-                "timestamp": datetime.utcnow().isoformat(),
-                "source_ip": event.get("source_ip", "192.168.1.1"),
+                "timestamp": timestamp,
+                "source_ip": source_ip,
                 "source_port": random.randint(1024, 65535),
-                "destination_ip": details.get("destination_ip", "10.0.0.1"),
-                "destination_port": details.get("port", random.choice([22, 80, 443, 3306, 8080])),
-                "protocol": details.get("protocol", random.choice(protocols)),
-                "flags": random.choice(flags),
+                "destination_ip": destination_ip,
+                "destination_port": port,
+                "protocol": protocol,
+                "flags": flag,
                 "size_bytes": random.randint(64, 1500),
-                "ttl": random.choice([64, 128, 255]),
-                "payload_preview": self._generate_payload_preview(incident_info.get("threat_type", ""))
+                "ttl": ttl,
+                "payload_preview": payload_preview
             }
-            packets.append(packet)
-        
-        return packets
+            for i, (port, protocol, flag, ttl) in enumerate(zip(
+                ports,
+                protocols,
+                random.choices(MOCK_FLAGS, k=count),
+                random.choices(MOCK_TTLS, k=count)
+            ))
+        ]
     
     def _generate_payload_preview(self, threat_type: str) -> str:
         """Generate realistic-looking payload preview based on threat type"""
-        payloads = {
-            "bruteforce": "[AUTH] Failed password for admin from 192.168.1.x port 52341 ssh2",
-            "malware": "[BINARY] MZ\\x90\\x00\\x03\\x00\\x00\\x00...PE signature detected",
-            "ddos": "[FLOOD] GET / HTTP/1.1\\r\\nHost: target.com\\r\\nUser-Agent: [RANDOMIZED]",
-            "sql_injection": "[SQL] SELECT * FROM users WHERE id='1' OR '1'='1'--",
-            "exfiltration": "[DATA] POST /upload HTTP/1.1\\r\\nContent-Length: 524288\\r\\n[ENCRYPTED]",
-            "privilege_escalation": "[SUDO] user : TTY=pts/0 ; PWD=/home/user ; USER=root ; COMMAND=/bin/bash",
-            "malicious_traffic": "[C2] BEACON: id=0x4A2B status=ACTIVE interval=60s",
-        }
-        return payloads.get(threat_type, "[ENCRYPTED DATA]")
+        return PAYLOAD_PREVIEWS.get(threat_type, "[ENCRYPTED DATA]")
     
     def _extract_indicators(
         self,
@@ -238,75 +438,10 @@ class ForensicsEngine:
     
     def _generate_recommendations(self, incident_info: Dict[str, Any]) -> List[str]:
         """Generate remediation recommendations based on incident type"""
-        threat_type = incident_info.get("threat_type", "")
-        severity = incident_info.get("severity", "medium")
-        
-        base_recommendations = [
-            "Document all findings for incident report",
-            "Review related logs for additional context",
-            "Update incident response runbook if needed"
-        ]
-        
-        threat_recommendations = {
-            "bruteforce": [
-                "Block source IP at firewall level",
-                "Force password reset for targeted accounts",
-                "Enable account lockout policy",
-                "Implement multi-factor authentication",
-                "Review authentication logs for successful compromise"
-            ],
-            "malware": [
-                "Isolate affected system immediately",
-                "Kill malicious process and quarantine files",
-                "Run full antivirus/EDR scan",
-                "Check for persistence mechanisms",
-                "Scan network for lateral movement indicators"
-            ],
-            "ddos": [
-                "Enable rate limiting on affected services",
-                "Activate CDN/DDoS protection services",
-                "Block attacking IP ranges at edge",
-                "Scale infrastructure if possible",
-                "Contact ISP for upstream filtering"
-            ],
-            "sql_injection": [
-                "Block source IP immediately",
-                "Review database for unauthorized changes",
-                "Check for data exfiltration",
-                "Patch vulnerable application",
-                "Implement Web Application Firewall (WAF) rules"
-            ],
-            "exfiltration": [
-                "Block destination IP and domain",
-                "Identify scope of data potentially leaked",
-                "Preserve logs for forensic analysis",
-                "Notify security leadership immediately",
-                "Prepare for potential breach disclosure"
-            ],
-            "privilege_escalation": [
-                "Revoke elevated privileges immediately",
-                "Reset all affected user credentials",
-                "Audit recent admin actions",
-                "Check for unauthorized changes to system files",
-                "Review sudo/admin group memberships"
-            ],
-            "malicious_traffic": [
-                "Block C2 IP/domain at DNS and firewall",
-                "Isolate infected host from network",
-                "Scan for additional compromised systems",
-                "Check for beaconing patterns in proxy logs",
-                "Identify initial infection vector"
-            ]
-        }
-        
-        recommendations = threat_recommendations.get(threat_type, [
-            "Investigate event source and context",
-            "Check for related suspicious activity",
-            "Escalate if severity is high or critical",
-            "Monitor for recurrence"
-        ])
-        
-        return recommendations + base_recommendations
+        recommendations = THREAT_RECOMMENDATIONS.get(
+            incident_info.get("threat_type", ""), DEFAULT_RECOMMENDATIONS
+        )
+        return [*recommendations, *BASE_RECOMMENDATIONS]
 
 
 # Global forensics engine instance
@@ -10,12 +10,22 @@ Supports both:
 - google-genai (new recommended package)
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import json
 import asyncio
+import hashlib
+import heapq
+import logging
 import os
+import time
 import warnings
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson encodes much faster than stdlib json; fall back if unavailable
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import demo mode config
 try:
@@ -27,36 +37,179 @@ except ImportError:
 # Suppress deprecation warnings from google-generativeai
 warnings.filterwarnings("ignore", category=FutureWarning, module="google.generativeai")
 
-# Try to import Gemini - support both old and new packages
-genai = None
-GEMINI_AVAILABLE = False
-GEMINI_VERSION = None
+from app.config import settings
 
-# Try new package first (google-genai)
-try:
-    from google import genai as new_genai
-    genai = new_genai
-    GEMINI_AVAILABLE = True
-    GEMINI_VERSION = "new"
-    print("[GEMINI] Using google-genai (new package)")
-except ImportError:
-    pass
+# Request-time failures go through the app logger (configured in main.py)
+logger = logging.getLogger("arc_sentinel")
+
+# Get API key from settings or environment
+GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", None) or os.environ.get("GEMINI_API_KEY")
+GEMINI_CONCURRENCY = getattr(settings, "GEMINI_CONCURRENCY", 0) or 4
+GEMINI_TIMEOUT_S = getattr(settings, "GEMINI_TIMEOUT_S", 0) or 30.0
+
+GEMINI_MODEL = "gemini-pro"
+
+# Process-wide pool for blocking Gemini SDK calls, kept apart from the default
+# executor so slow model calls never queue behind (or starve) database work.
+# Created on first use: demo mode, a missing API key and the async SDK paths
+# never need it.
+_GEMINI_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _gemini_executor() -> ThreadPoolExecutor:
+    """Get the Gemini thread pool, creating it on first use"""
+    global _GEMINI_EXECUTOR
+    if _GEMINI_EXECUTOR is None:
+        _GEMINI_EXECUTOR = ThreadPoolExecutor(
+            max_workers=GEMINI_CONCURRENCY,
+            thread_name_prefix="gemini"
+        )
+    return _GEMINI_EXECUTOR
+
+
+def shutdown_executor():
+    """Release the Gemini threads, if the pool was ever created"""
+    global _GEMINI_EXECUTOR
+    if _GEMINI_EXECUTOR is None:
+        return
+    _GEMINI_EXECUTOR.shutdown(wait=False)
+    _GEMINI_EXECUTOR = None
+
+# Bursts of the same attack produce near-identical prompts; reuse the summary
+SUMMARY_CACHE_TTL_SECONDS = 300
+SUMMARY_CACHE_MAX_ENTRIES = 512
+
+# Static prompt scaffolding, built once; the builders only join in the
+# per-incident sections
+SUMMARY_PREAMBLE = """
+You are a Senior SOC (Security Operations Center) Analyst. 
+Summarize this forensic snapshot for Incident Response (IR) analysis. 
+Provide remediation in 5 bullets."""
+
+SUMMARY_OUTPUT_INSTRUCTIONS = """=== REQUIRED OUTPUT ===
+Please provide a structured analysis with:
+
+1. **Executive Summary** (2-3 sentences for management briefing)
+
+2. **Technical Analysis** (What happened, attack vector, affected components)
+
+3. **Impact Assessment** (What systems/data may be compromised, business impact)
+
+4. **Remediation Recommendations** (Exactly 5 specific, actionable bullet points)
+
+5. **Prevention Measures** (How to prevent this type of incident in the future)
+
+Format your response in clear markdown with the headers above.
+Be specific and actionable. Avoid generic advice."""
 
-# Fallback to old package (google-generativeai)
-if not GEMINI_AVAILABLE:
+PATTERN_PREAMBLE = """
+You are a Threat Intelligence Analyst reviewing security events.
+Analyze these events for patterns indicative of: """
+
+PATTERN_OUTPUT_INSTRUCTIONS = """=== ANALYSIS REQUIRED ===
+1. **Pattern Confidence** (Low/Medium/High) with justification
+2. **Attack Stage** (Reconnaissance/Initial Access/Execution/Persistence/Exfiltration)
+3. **Threat Actor TTPs** (Techniques, Tactics, Procedures observed)
+4. **Immediate Actions** (3 specific steps to take now)
+5. **MITRE ATT&CK Mapping** (Relevant technique IDs if applicable)
+
+Be specific and reference actual data from the events.
+"""
+
+
+def _load_genai() -> Tuple[Any, Optional[str]]:
+    """
+    Import the installed Gemini SDK: (module, "new" | "legacy"), or (None, None).
+    Deferred until a client actually needs it - these packages pull in gRPC,
+    protobuf and google-auth, which demo/keyless deployments never use.
+    """
+    # Try new package first (google-genai)
+    try:
+        from google import genai as new_genai
+        print("[GEMINI] Using google-genai (new package)")
+        return new_genai, "new"
+    except ImportError:
+        pass
+    
+    # Fallback to old package (google-generativeai)
     try:
         import google.generativeai as old_genai
-        genai = old_genai
-        GEMINI_AVAILABLE = True
-        GEMINI_VERSION = "legacy"
         print("[GEMINI] Using google-generativeai (legacy package)")
+        return old_genai, "legacy"
     except ImportError:
         print("[GEMINI] No Gemini package installed. AI summaries disabled.")
-
-from app.config import settings
-
-# Get API key from settings or environment
-GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", None) or os.environ.get("GEMINI_API_KEY")
+        return None, None
+
+
+# Indicators that change on every report (e.g. the detection timestamp) and
+# so must not be part of the summary fingerprint
+_VOLATILE_INDICATOR_PREFIXES = ("Detection Time:",)
+
+
+def _summary_key(incident: Dict[str, Any], forensic_data: Dict[str, Any]) -> str:
+    """Stable fingerprint of the fields that shape an incident summary"""
+    indicators = tuple(
+        indicator for indicator in forensic_data.get("suspicious_indicators", [])
+        if not str(indicator).startswith(_VOLATILE_INDICATOR_PREFIXES)
+    )
+    identity = (
+        incident.get("type", incident.get("threat_type", "Unknown")),
+        incident.get("severity", "Unknown"),
+        indicators,
+        round(incident.get("anomaly_score", 0) or 0, 1),
+    )
+    if not indicators:
+        # Without a forensic report nothing tells two incidents of the same
+        # type apart, so only reuse a summary for the same incident
+        identity += (incident.get("id"), incident.get("description"))
+    return hashlib.blake2b(repr(identity).encode(), digest_size=16).hexdigest()
+
+
+def _pattern_key(incident_type: str, events_summary: str) -> str:
+    """Fingerprint of a pattern-analysis request (shares the summary cache)"""
+    identity = f"pattern\0{incident_type}\0{events_summary}"
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+
+def _events_json(events: list) -> str:
+    """Indented JSON for the events section of the pattern-analysis prompt"""
+    if orjson is not None:
+        return orjson.dumps(
+            events,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+            default=str
+        ).decode()
+    return json.dumps(events, indent=2, default=str)
+
+
+def _fmt_process(p: Dict[str, Any]) -> str:
+    """One prompt line per process (plain text reads better than JSON and is cheaper)"""
+    if "error" in p:
+        return f"- error: {p['error']}"
+    return (
+        f"- {p.get('name')} (pid={p.get('pid')}, user={p.get('username')}) "
+        f"cpu={p.get('cpu_percent')}% mem={p.get('memory_percent')}% status={p.get('status')}"
+    )
+
+
+def _fmt_connection(c: Dict[str, Any]) -> str:
+    """One prompt line per network connection"""
+    if "error" in c:
+        return f"- error: {c['error']}"
+    return (
+        f"- {c.get('local_address')} -> {c.get('remote_address')} "
+        f"[{c.get('status')}] process={c.get('process_name', 'unknown')}"
+    )
+
+
+def _fmt_packet(p: Dict[str, Any]) -> str:
+    """One prompt line per captured packet"""
+    return (
+        f"- #{p.get('sequence')} {p.get('protocol')} "
+        f"{p.get('source_ip')}:{p.get('source_port')} -> {p.get('destination_ip')}:{p.get('destination_port')} "
+        f"flags={p.get('flags')} size={p.get('size_bytes')}B ttl={p.get('ttl')} "
+        f"payload={p.get('payload_preview')}"
+    )
 
 
 class GeminiClient:
@@ -74,12 +227,48 @@ class GeminiClient:
     def __init__(self):
         self.model = None
         self.is_configured = False
+        # Gemini SDK module and flavour ("new" | "legacy"), imported in _configure
+        self._genai = None
+        self._genai_version: Optional[str] = None
+        # google-genai async models API and its generation config (new SDK only)
+        self._aio_models = None
+        self._generation_config = None
+        # fingerprint -> (expires_at, summary)
+        self._summary_cache: Dict[str, Tuple[float, str]] = {}
+        # fingerprint -> task generating that summary right now
+        self._summary_inflight: Dict[str, asyncio.Task] = {}
         self._configure()
     
+    async def aclose(self):
+        """Cancel summaries still in flight and release the Gemini threads (called on app shutdown)"""
+        for task in list(self._summary_inflight.values()):
+            task.cancel()
+        self._summary_inflight.clear()
+        shutdown_executor()
+    
+    async def _generate(self, prompt: str):
+        """
+        Call the model without blocking the event loop, bounded by GEMINI_TIMEOUT_S.
+        google-genai goes through its async client; the legacy SDK uses its
+        native coroutine when present, otherwise the Gemini thread pool.
+        """
+        async with asyncio.timeout(GEMINI_TIMEOUT_S):
+            if self._aio_models is not None:
+                return await self._aio_models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=prompt,
+                    config=self._generation_config
+                )
+            generate_async = getattr(self.model, "generate_content_async", None)
+            if generate_async is not None:
+                return await generate_async(prompt)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_gemini_executor(), self.model.generate_content, prompt)
+    
     def _configure(self):
         """Configure Gemini API with credentials. Never crashes."""
-        if not GEMINI_AVAILABLE:
-            print("[GEMINI] Library not available. Summaries will use fallback.")
+        if DEMO_MODE:
+            print("[GEMINI] Demo mode: using canned summaries, SDK not loaded.")
             self.is_configured = False
             return
             
@@ -87,24 +276,43 @@ class GeminiClient:
             print("[GEMINI] No API key configured. Summaries will use fallback.")
             self.is_configured = False
             return
+        
+        genai, self._genai_version = _load_genai()
+        if genai is None:
+            print("[GEMINI] Library not available. Summaries will use fallback.")
+            self.is_configured = False
+            return
+        self._genai = genai
             
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            # Configure model with temperature 0.2 for consistent, factual output
-            generation_config = genai.types.GenerationConfig(
-                temperature=0.2,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=2048
-            )
-            self.model = genai.GenerativeModel(
-                'gemini-pro',
-                generation_config=generation_config
-            )
+            if self._genai_version == "new":
+                # google-genai: native coroutines via client.aio, no thread hop
+                client = genai.Client(api_key=GEMINI_API_KEY)
+                self._generation_config = genai.types.GenerateContentConfig(
+                    temperature=0.2,
+                    top_p=0.8,
+                    top_k=40,
+                    max_output_tokens=2048
+                )
+                self._aio_models = client.aio.models
+                self.model = client
+            else:
+                genai.configure(api_key=GEMINI_API_KEY)
+                # Configure model with temperature 0.2 for consistent, factual output
+                generation_config = genai.types.GenerationConfig(
+                    temperature=0.2,
+                    top_p=0.8,
+                    top_k=40,
+                    max_output_tokens=2048
+                )
+                self.model = genai.GenerativeModel(
+                    GEMINI_MODEL,
+                    generation_config=generation_config
+                )
             self.is_configured = True
-            print("[GEMINI] API configured successfully (temperature=0.2)")
+            print(f"[GEMINI] API configured successfully ({self._genai_version} SDK, temperature=0.2)")
         except Exception as e:
-            print(f"[GEMINI] Configuration error: {e}")
+            logger.error("[GEMINI] Configuration error: %s", e)
             self.is_configured = False
     
     async def summarize_incident(
@@ -129,26 +337,69 @@ class GeminiClient:
         if not self.is_configured or not self.model:
             return self._generate_fallback_summary(incident, forensic_data)
         
+        cache_key = _summary_key(incident, forensic_data)
+        cached = self._cached_summary(cache_key)
+        if cached is not None:
+            return cached
+        
+        # An identical incident is already being summarized: share its result
+        inflight = self._summary_inflight.get(cache_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        task = asyncio.get_running_loop().create_task(
+            self._summarize_single(incident, forensic_data, cache_key)
+        )
+        self._summary_inflight[cache_key] = task
+        task.add_done_callback(lambda _, key=cache_key: self._summary_inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the result for the others
+        return await asyncio.shield(task)
+    
+    async def _summarize_single(
+        self,
+        incident: Dict[str, Any],
+        forensic_data: Dict[str, Any],
+        cache_key: str
+    ) -> str:
+        """One Gemini call for one incident, with the usual fallbacks"""
         try:
             prompt = self._build_summary_prompt(incident, forensic_data)
             
-            # Run generation in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                partial(self.model.generate_content, prompt)
-            )
+            response = await self._generate(prompt)
             
             if response and response.text:
+                self._cache_summary(cache_key, response.text)
                 return response.text
             else:
                 return self._generate_fallback_summary(incident, forensic_data)
                 
         except Exception as e:
-            print(f"[GEMINI] Summarization error: {e}")
+            logger.error("[GEMINI] Summarization error: %s", e)
             # Return fallback message when Gemini fails
             return "Gemini unavailable. Summary not generated. " + self._generate_fallback_summary(incident, forensic_data)
     
+    def _cached_summary(self, key: str) -> Optional[str]:
+        """Return a live cached summary, dropping it if expired"""
+        cached = self._summary_cache.get(key)
+        if cached is None:
+            return None
+        if cached[0] > time.monotonic():
+            return cached[1]
+        del self._summary_cache[key]
+        return None
+    
+    def _cache_summary(self, key: str, summary: str):
+        """Store a Gemini summary, dropping expired/oldest entries when full"""
+        cache = self._summary_cache
+        if len(cache) >= SUMMARY_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for stale in [k for k, (expires, _) in cache.items() if expires <= now]:
+                del cache[stale]
+            if len(cache) >= SUMMARY_CACHE_MAX_ENTRIES:
+                # dicts keep insertion order: the first key is the oldest
+                del cache[next(iter(cache))]
+        cache[key] = (time.monotonic() + SUMMARY_CACHE_TTL_SECONDS, summary)
+    
     def _build_summary_prompt(
         self,
         incident: Dict[str, Any],
@@ -175,12 +426,13 @@ class GeminiClient:
         indicators = forensic_data.get("suspicious_indicators", [])
         
         # Top processes by CPU
-        top_processes = sorted(processes[:5], key=lambda x: x.get('cpu_percent', 0), reverse=True) if processes else []
+        top_processes = heapq.nlargest(5, processes, key=lambda x: x.get('cpu_percent') or 0) if processes else []
+        process_lines = "\n".join(map(_fmt_process, top_processes)) if top_processes else "No process data available"
+        connection_lines = "\n".join(map(_fmt_connection, connections[:5])) if connections else "No connection data available"
+        packet_lines = "\n".join(map(_fmt_packet, packet_data[:3])) if packet_data else "No packet data available"
+        indicator_lines = "- " + "\n- ".join(map(str, indicators)) if indicators else "None identified"
         
-        prompt = f"""
-You are a Senior SOC (Security Operations Center) Analyst. 
-Summarize this forensic snapshot for Incident Response (IR) analysis. 
-Provide remediation in 5 bullets.
+        prompt = f"""{SUMMARY_PREAMBLE}
 
 === INCIDENT DETAILS ===
 Incident Type: {incident_type}
@@ -198,33 +450,19 @@ Disk Usage: {system_info.get("disk_percent", "N/A")}%
 System Uptime: {system_info.get("uptime_hours", "N/A")} hours
 
 === TOP PROCESSES (by CPU) ===
-{json.dumps(top_processes, indent=2) if top_processes else "No process data available"}
+{process_lines}
 
 === NETWORK CONNECTIONS ===
 Active Connections: {len(connections)}
-{json.dumps(connections[:5], indent=2) if connections else "No connection data available"}
+{connection_lines}
 
 === PACKET CAPTURE SUMMARY ===
-{json.dumps(packet_data[:3], indent=2) if packet_data else "No packet data available"}
+{packet_lines}
 
 === INDICATORS OF COMPROMISE (IOCs) ===
-{chr(10).join([f"- {i}" for i in indicators]) if indicators else "None identified"}
-
-=== REQUIRED OUTPUT ===
-Please provide a structured analysis with:
-
-1. **Executive Summary** (2-3 sentences for management briefing)
+{indicator_lines}
 
-2. **Technical Analysis** (What happened, attack vector, affected components)
-
-3. **Impact Assessment** (What systems/data may be compromised, business impact)
-
-4. **Remediation Recommendations** (Exactly 5 specific, actionable bullet points)
-
-5. **Prevention Measures** (How to prevent this type of incident in the future)
-
-Format your response in clear markdown with the headers above.
-Be specific and actionable. Avoid generic advice.
+{SUMMARY_OUTPUT_INSTRUCTIONS}
 """
         return prompt
     
@@ -263,35 +501,27 @@ This appears to be in the **Execution/Persistence** phase of the attack lifecycl
             return "Gemini unavailable. AI analysis not available - API not configured."
         
         try:
-            events_summary = json.dumps(events[:10], indent=2, default=str)
+            events_summary = _events_json(events[:10])
+            cache_key = _pattern_key(incident_type, events_summary)
+            cached = self._cached_summary(cache_key)
+            if cached is not None:
+                return cached
             
-            prompt = f"""
-You are a Threat Intelligence Analyst reviewing security events.
-Analyze these events for patterns indicative of: {incident_type}
-
-=== EVENTS DATA ===
-{events_summary}
-
-=== ANALYSIS REQUIRED ===
-1. **Pattern Confidence** (Low/Medium/High) with justification
-2. **Attack Stage** (Reconnaissance/Initial Access/Execution/Persistence/Exfiltration)
-3. **Threat Actor TTPs** (Techniques, Tactics, Procedures observed)
-4. **Immediate Actions** (3 specific steps to take now)
-5. **MITRE ATT&CK Mapping** (Relevant technique IDs if applicable)
-
-Be specific and reference actual data from the events.
-"""
-            
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                partial(self.model.generate_content, prompt)
+            prompt = (
+                f"{PATTERN_PREAMBLE}{incident_type}\n\n"
+                f"=== EVENTS DATA ===\n{events_summary}\n\n"
+                f"{PATTERN_OUTPUT_INSTRUCTIONS}"
             )
             
-            return response.text if response and response.text else "Gemini unavailable. Analysis not available."
+            response = await self._generate(prompt)
+            
+            if response and response.text:
+                self._cache_summary(cache_key, response.text)
+                return response.text
+            return "Gemini unavailable. Analysis not available."
             
         except Exception as e:
-            print(f"[GEMINI] Pattern analysis error: {e}")
+            logger.error("[GEMINI] Pattern analysis error: %s", e)
             return f"Gemini unavailable. Summary not generated. Analysis error: {str(e)}"
     
     def _generate_fallback_summary(
@@ -308,6 +538,11 @@ Be specific and reference actual data from the events.
         recommendations = forensic_data.get("recommended_actions", [])
         system_info = forensic_data.get("system_info", {})
         
+        indicator_lines = "- " + "\n- ".join(map(str, indicators)) if indicators else "- None identified"
+        recommendation_lines = "\n".join(
+            f"{n}. {r}" for n, r in enumerate(recommendations[:5], 1)
+        ) if recommendations else "1. Follow standard incident response procedures"
+        
         summary = f"""
 ## Incident Summary
 
@@ -323,7 +558,7 @@ A {severity} severity {incident_type} incident has been detected and requires im
 {incident.get("description", "Incident detected by automated monitoring system.")}
 
 ### Indicators of Compromise
-{chr(10).join([f"- {i}" for i in indicators]) if indicators else "- None identified"}
+{indicator_lines}
 
 ### System State at Detection
 - **CPU:** {system_info.get("cpu_percent", "N/A")}%
@@ -333,7 +568,7 @@ A {severity} severity {incident_type} incident has been detected and requires im
 - **Network Connections:** {len(forensic_data.get("connections", []))}
 
 ### Remediation Recommendations
-{chr(10).join([f"{i+1}. {r}" for i, r in enumerate(recommendations[:5])]) if recommendations else "1. Follow standard incident response procedures"}
+{recommendation_lines}
 
 ### Prevention Measures
 1. Review and update detection rules
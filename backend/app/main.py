@@ -19,27 +19,29 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 import asyncio
 import json
 import hashlib
+import logging
 import os
 
 # Local imports
-from app.config import settings
+from app.config import settings, DEMO_MODE, demo_mode
 from app.database import (
     SupabaseClient, Database, insert_event, get_events, insert_incident, get_incidents,
     get_incident_by_id, update_incident, insert_forensic_report,
     get_forensic_report, get_all_forensic_reports, update_forensic_report,
-    get_stats, sign_up_user, sign_in_user, sign_out_user, get_user_from_token,
+    get_stats, sign_up_user, sign_in_user, sign_out_user, get_user_from_token, AuthUser,
     refresh_session, reset_password, create_or_update_user_profile,
     get_event_frequency, get_event_type_rarity, get_ip_rarity, log_audit, mark_device_isolated
 )
 from app.websocket_manager import ws_manager
-from app.detection import detection_engine, DetectionResult, Severity, ThreatType
+from app.detection import detection_engine, intern_event_type, DetectionResult, Severity, ThreatType
 from app.ml_engine import ml_detector
-from app.forensics import forensics_engine
+from app.forensics import forensics_engine, serialize_snapshot
 from app.gemini_client import gemini_client
 from app.telemetry import telemetry_generator, attack_chain_generator
 from app.models import (
@@ -51,6 +53,16 @@ from app.models import (
 )
 from app.response_engine import response_engine
 
+# Per-event / per-request diagnostics go through logging: %-style arguments are
+# only formatted when the level is enabled. DEBUG traces need settings.DEBUG.
+logger = logging.getLogger("arc_sentinel")
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+    logger.propagate = False
+
 
 # ============================================================================
 # Telemetry Background Task
@@ -59,6 +71,40 @@ from app.response_engine import response_engine
 telemetry_task: Optional[asyncio.Task] = None
 
 
+# Fire-and-forget work (event inserts, broadcasts). The set keeps strong
+# references so pending tasks aren't garbage collected; the semaphore caps
+# how many run at once.
+_background_tasks: Set[asyncio.Task] = set()
+_background_limit = asyncio.Semaphore(256)
+
+
+async def _bounded(coro):
+    """Run a background coroutine under the concurrency cap, logging failures"""
+    async with _background_limit:
+        try:
+            return await coro
+        except Exception as e:
+            logger.error("[BACKGROUND] Task failed: %s", e)
+
+
+def _spawn(coro) -> asyncio.Task:
+    """Schedule a coroutine without waiting for it"""
+    task = asyncio.create_task(_bounded(coro))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float = 5.0):
+    """Give pending background tasks a chance to finish, then cancel the rest"""
+    if not _background_tasks:
+        return
+    done, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    logger.info("[SHUTDOWN] Background tasks drained (%d finished, %d cancelled)", len(done), len(pending))
+
+
 async def telemetry_loop():
     """Background task that generates telemetry every 5 seconds"""
     print("[TELEMETRY] Background task started")
@@ -120,12 +166,15 @@ async def process_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     try:
         # Compute ML features
         source_ip = event.get("source_ip", "0.0.0.0")
+        intern_event_type(event)
         event_type = event.get("type", "unknown")
         
-        # Get frequency and rarity from database
-        event_freq = await get_event_frequency(source_ip, minutes=5)
-        type_rarity = await get_event_type_rarity(event_type)
-        ip_rarity = await get_ip_rarity(source_ip)
+        # Get frequency and rarity from database (independent queries, one round trip)
+        event_freq, type_rarity, ip_rarity = await asyncio.gather(
+            get_event_frequency(source_ip, minutes=5),
+            get_event_type_rarity(event_type),
+            get_ip_rarity(source_ip)
+        )
         
         # Add ML context to event
         event["ml_context"] = {
@@ -151,39 +200,47 @@ async def process_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                 severity=Severity.HIGH,
                 description=f"ML anomaly detected (score: {anomaly_score:.2f})",
                 confidence=anomaly_score,
-                indicators=[
+                indicators=(
                     f"Anomaly score: {anomaly_score:.2f}",
                     f"Event frequency: {event_freq} in 5min",
                     f"Type rarity: {type_rarity:.2f}",
                     f"IP rarity: {ip_rarity:.2f}"
-                ]
+                )
             )
         
-        # Store event in database
-        await insert_event(event)
+        # Store event in database without blocking the pipeline
+        insert_task = _spawn(insert_event(event))
         
         # Create incident if threat detected
         if detection_result.is_threat:
+            # incidents.event_id references events.id: the event row must exist first
+            await insert_task
             incident = await create_incident_from_detection(event, detection_result)
             
             # Execute automated response for critical incidents
             if incident and incident.get("severity") == "critical":
                 response_result = await response_engine.execute_response(incident)
-                print(f"[RESPONSE] Automated response executed: {len(response_result.get('actions_taken', []))} actions")
+                logger.info("[RESPONSE] Automated response executed: %d actions", len(response_result.get('actions_taken', [])))
         
-        # Broadcast to WebSocket clients with proper event tagging
-        await ws_manager.broadcast({
+        # Broadcast to WebSocket clients with proper event tagging (slow clients
+        # must not stall ingestion of the next event)
+        _spawn(ws_manager.broadcast({
             "event": "NEW_EVENT",
             "type": "new_event",
             "data": event
-        })
+        }))
         
     except Exception as e:
-        print(f"[PROCESS] Error processing event: {e}")
+        logger.error("[PROCESS] Error processing event: %s", e)
     
     return incident
 
 
+def _mint_id(*parts: str) -> str:
+    """16-hex-char record ID from the given parts (BLAKE2b, 8-byte digest)"""
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
+
+
 async def create_incident_from_detection(
     event: Dict[str, Any],
     detection_result: DetectionResult
@@ -191,9 +248,8 @@ async def create_incident_from_detection(
     """Create an incident and forensic report from a detection"""
     
     # Create incident record
-    incident_id = hashlib.md5(
-        f"{datetime.utcnow().isoformat()}{event.get('id')}".encode()
-    ).hexdigest()[:16]
+    now = datetime.utcnow().isoformat()
+    incident_id = _mint_id(now, str(event.get("id")))
     
     incident = {
         "id": incident_id,
@@ -208,16 +264,16 @@ async def create_incident_from_detection(
         "ml_flagged": event.get("ml_flagged", False),
         "confidence": detection_result.confidence,
         "indicators": json.dumps(detection_result.indicators) if detection_result.indicators else "[]",
-        "created_at": datetime.utcnow().isoformat(),
-        "updated_at": datetime.utcnow().isoformat(),
-        "timestamp": datetime.utcnow().isoformat()
+        "created_at": now,
+        "updated_at": now,
+        "timestamp": now
     }
     
     # Store incident
     await insert_incident(incident)
     
     # Capture forensic snapshot
-    forensic_snapshot = forensics_engine.capture_snapshot(
+    forensic_snapshot = await forensics_engine.capture_snapshot(
         event,
         {
             "threat_type": detection_result.threat_type.value if detection_result.threat_type else "unknown",
@@ -226,16 +282,27 @@ async def create_incident_from_detection(
         }
     )
     
-    # Store forensic report
+    # Encode each snapshot list once; demo snapshots carry the constant
+    # demo process/connection lists, which are already serialized
+    encoded = serialize_snapshot(
+        forensic_snapshot,
+        {
+            "processes": demo_mode.DEMO_PROCESSES_JSON,
+            "connections": demo_mode.DEMO_CONNECTIONS_JSON
+        } if DEMO_MODE else None
+    )
+    
+    # Store forensic report (stamped after the capture finished)
+    report_time = datetime.utcnow().isoformat()
     report = {
-        "id": hashlib.md5(f"{incident_id}{datetime.utcnow().isoformat()}".encode()).hexdigest()[:16],
+        "id": _mint_id(incident_id, report_time),
         "incident_id": incident_id,
-        "processes": json.dumps(forensic_snapshot.get("processes", [])),
-        "connections": json.dumps(forensic_snapshot.get("connections", [])),
-        "packet_data": json.dumps(forensic_snapshot.get("packet_data", [])),
+        "processes": encoded["processes"],
+        "connections": encoded["connections"],
+        "packet_data": encoded["packet_data"],
         "gemini_summary": None,
-        "created_at": datetime.utcnow().isoformat(),
-        "forensic_data": json.dumps(forensic_snapshot)
+        "created_at": report_time,
+        "forensic_data": encoded["forensic_data"]
     }
     await insert_forensic_report(report)
     
@@ -254,7 +321,7 @@ async def create_incident_from_detection(
     
     await ws_manager.broadcast(broadcast_data)
     
-    print(f"[INCIDENT] Created: {detection_result.threat_type} - {detection_result.severity}")
+    logger.info("[INCIDENT] Created: %s - %s", detection_result.threat_type, detection_result.severity)
     
     return incident
 
@@ -273,6 +340,12 @@ async def lifespan(app: FastAPI):
     print(f"[STARTUP] Supabase URL: {settings.SUPABASE_URL[:30]}..." if settings.SUPABASE_URL else "[STARTUP] Supabase not configured")
     print(f"[STARTUP] Gemini API: {'Configured' if settings.GEMINI_API_KEY else 'Not configured'}")
     
+    # Database calls run in the default executor (asyncio.to_thread); size it
+    # for concurrent requests rather than the CPU-count based default
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=32, thread_name_prefix="arc-io")
+    )
+    
     # Initialize database connection
     SupabaseClient.get_client()
     
@@ -290,6 +363,8 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("[SHUTDOWN] Stopping background tasks...")
     await stop_telemetry_generator()
+    await drain_background_tasks()
+    await gemini_client.aclose()
     print("[SHUTDOWN] Complete")
 
 
@@ -305,10 +380,9 @@ app = FastAPI(
 )
 
 # CORS Configuration
-origins = settings.CORS_ORIGINS.split(",") if settings.CORS_ORIGINS != "*" else ["*"]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"]
@@ -348,7 +422,7 @@ async def shutdown_event():
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     authorization: Optional[str] = Header(None)
-) -> Dict[str, Any]:
+) -> AuthUser:
     """
     Verify Supabase access token and get current user.
     Accepts token from Authorization header (Bearer token).
@@ -366,34 +440,34 @@ async def get_current_user(
             token = authorization
     
     if not token:
-        print("[AUTH] No token provided in request")
+        logger.info("[AUTH] No token provided in request")
         raise HTTPException(
             status_code=401,
             detail="Authorization token required",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    print(f"[AUTH] Token received: {token[:20]}...")
+    logger.debug("[AUTH] Token received: %.20s...", token)
     
     # Verify token with Supabase
     user = await get_user_from_token(token)
     
     if not user:
-        print("[AUTH] Token verification failed")
+        logger.info("[AUTH] Token verification failed")
         raise HTTPException(
             status_code=401,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    print(f"[AUTH] User authenticated: {user.get('email')}")
+    logger.debug("[AUTH] User authenticated: %s", user.email)
     return user
 
 
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     authorization: Optional[str] = Header(None)
-) -> Optional[Dict[str, Any]]:
+) -> Optional[AuthUser]:
     """
     Optional authentication - returns None if no valid token.
     Used for demo/hackathon endpoints that should work without login.
@@ -497,7 +571,7 @@ async def login(request: LoginRequest):
 
 
 @app.post("/api/auth/logout")
-async def logout(user: Dict = Depends(get_current_user)):
+async def logout(user: AuthUser = Depends(get_current_user)):
     """Sign out the current user"""
     # Note: Client should also clear stored tokens
     return {"message": "Logged out successfully"}
@@ -530,13 +604,13 @@ async def request_password_reset(request: ResetPasswordRequest):
 
 
 @app.get("/api/auth/me")
-async def get_current_user_info(user: Dict = Depends(get_current_user)):
+async def get_current_user_info(user: AuthUser = Depends(get_current_user)):
     """Get the current authenticated user's information"""
     return {
-        "id": user.get("id"),
-        "email": user.get("email"),
-        "role": user.get("role", "analyst"),
-        "email_confirmed": user.get("email_confirmed", False)
+        "id": user.id,
+        "email": user.email,
+        "role": user.role,
+        "email_confirmed": user.email_confirmed
     }
 
 
@@ -581,7 +655,7 @@ async def list_events(
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
     ml_flagged: Optional[bool] = None,
-    user: Optional[Dict] = Depends(get_optional_user)
+    user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Get list of events with optional filters including date range"""
     start_time = None
@@ -621,7 +695,7 @@ async def list_incidents(
     status: Optional[str] = None,
     severity: Optional[str] = None,
     threat_type: Optional[str] = None,
-    user: Optional[Dict] = Depends(get_optional_user)
+    user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Get list of incidents with optional filters and dashboard summary"""
     incidents = await get_incidents(limit=limit, status=status)
@@ -648,7 +722,7 @@ async def list_incidents(
 
 
 @app.get("/api/incident/{incident_id}")
-async def get_incident(incident_id: str, user: Optional[Dict] = Depends(get_optional_user)):
+async def get_incident(incident_id: str, user: Optional[AuthUser] = Depends(get_optional_user)):
     """Get single incident details with forensic report"""
     incident = await get_incident_by_id(incident_id)
     if not incident:
@@ -671,7 +745,7 @@ async def get_incident(incident_id: str, user: Optional[Dict] = Depends(get_opti
 async def resolve_incident(
     incident_id: str,
     resolve_data: IncidentResolveRequest,
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Resolve an incident with closure summary and broadcast update"""
     incident = await get_incident_by_id(incident_id)
@@ -681,7 +755,7 @@ async def resolve_incident(
     resolution_data = {
         "status": "resolved",
         "resolved_at": datetime.utcnow().isoformat(),
-        "resolved_by": user.get("email", "unknown"),
+        "resolved_by": user.email or "unknown",
         "resolution_notes": resolve_data.resolution_notes,
         "updated_at": datetime.utcnow().isoformat()
     }
@@ -690,7 +764,7 @@ async def resolve_incident(
     
     # Log audit
     await log_audit(
-        user_id=user.get("id", "unknown"),
+        user_id=user.id,
         action="incident_resolved",
         details={"incident_id": incident_id, "notes": resolve_data.resolution_notes}
     )
@@ -702,7 +776,7 @@ async def resolve_incident(
         "data": {
             "incident_id": incident_id,
             "status": "resolved",
-            "resolved_by": user.get("email"),
+            "resolved_by": user.email,
             "resolved_at": resolution_data["resolved_at"]
         }
     })
@@ -711,14 +785,14 @@ async def resolve_incident(
         "status": "resolved",
         "incident_id": incident_id,
         "resolved_at": resolution_data["resolved_at"],
-        "resolved_by": user.get("email")
+        "resolved_by": user.email
     }
 
 
 @app.post("/api/incident/{incident_id}/investigate")
 async def mark_investigating(
     incident_id: str,
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Mark an incident as under investigation"""
     incident = await get_incident_by_id(incident_id)
@@ -727,7 +801,7 @@ async def mark_investigating(
     
     update_data = {
         "status": "investigating",
-        "investigating_by": user.get("email", "unknown"),
+        "investigating_by": user.email or "unknown",
         "investigation_started_at": datetime.utcnow().isoformat(),
         "updated_at": datetime.utcnow().isoformat()
     }
@@ -741,7 +815,7 @@ async def mark_investigating(
         "data": {
             "incident_id": incident_id,
             "status": "investigating",
-            "investigating_by": user.get("email")
+            "investigating_by": user.email
         }
     })
     
@@ -749,7 +823,7 @@ async def mark_investigating(
 
 
 @app.get("/api/incidents/counts")
-async def get_incident_counts(user: Optional[Dict] = Depends(get_optional_user)):
+async def get_incident_counts(user: Optional[AuthUser] = Depends(get_optional_user)):
     """Get dashboard metrics counts"""
     return await get_stats()
 
@@ -759,7 +833,7 @@ async def get_incident_counts(user: Optional[Dict] = Depends(get_optional_user))
 # ============================================================================
 
 @app.get("/api/stats", response_model=StatsResponse)
-async def get_statistics(user: Optional[Dict] = Depends(get_optional_user)):
+async def get_statistics(user: Optional[AuthUser] = Depends(get_optional_user)):
     """Get dashboard statistics"""
     return await get_stats()
 
@@ -771,7 +845,7 @@ async def get_statistics(user: Optional[Dict] = Depends(get_optional_user)):
 @app.get("/api/reports")
 async def list_reports(
     limit: int = Query(100, ge=1, le=500),
-    user: Optional[Dict] = Depends(get_optional_user)
+    user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Get all forensic reports"""
     reports = await get_all_forensic_reports(limit=limit)
@@ -779,7 +853,7 @@ async def list_reports(
 
 
 @app.get("/api/report/{incident_id}")
-async def get_report(incident_id: str, user: Optional[Dict] = Depends(get_optional_user)):
+async def get_report(incident_id: str, user: Optional[AuthUser] = Depends(get_optional_user)):
     """Get forensic report for an incident"""
     report = await get_forensic_report(incident_id)
     if not report:
@@ -803,7 +877,7 @@ async def get_report(incident_id: str, user: Optional[Dict] = Depends(get_option
 async def simulate_attack(
     attack: AttackSimulationRequest,
     background_tasks: BackgroundTasks,
-    user: Optional[Dict] = Depends(get_optional_user)
+    user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """
     Simulate a multi-stage attack.
@@ -851,7 +925,7 @@ async def simulate_attack(
 # ============================================================================
 
 @app.post("/api/ml/train", response_model=MLTrainResponse)
-async def train_ml_model(user: Dict = Depends(get_current_user)):
+async def train_ml_model(user: AuthUser = Depends(get_current_user)):
     """
     Train Isolation Forest ML model on baseline events.
     Manual trigger from UI.
@@ -872,7 +946,7 @@ async def train_ml_model(user: Dict = Depends(get_current_user)):
 
 
 @app.get("/api/ml/status")
-async def get_ml_status(user: Optional[Dict] = Depends(get_optional_user)):
+async def get_ml_status(user: Optional[AuthUser] = Depends(get_optional_user)):
     """Get ML model status"""
     return {
         "is_trained": ml_detector.is_trained,
@@ -889,7 +963,7 @@ async def get_ml_status(user: Optional[Dict] = Depends(get_optional_user)):
 @app.post("/api/gemini/summarize/{incident_id}", response_model=GeminiSummarizeResponse)
 async def summarize_incident_with_gemini(
     incident_id: str,
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """
     Generate AI summary for an incident using Gemini.
@@ -935,14 +1009,14 @@ async def summarize_incident_with_gemini(
 async def isolate_process_endpoint(
     pid: int,
     incident_id: Optional[str] = Query(None),
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Isolate a suspicious process by PID"""
     result = await response_engine.isolate_process(pid, incident_id or "manual")
     
     # Log audit
     await log_audit(
-        user_id=user.get("id", "unknown"),
+        user_id=user.id,
         action="process_isolated",
         details={"pid": pid, "incident_id": incident_id}
     )
@@ -955,7 +1029,7 @@ async def quarantine_device_endpoint(
     device_id: str = Query(...),
     source_ip: str = Query(...),
     incident_id: Optional[str] = Query(None),
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Quarantine a device"""
     result = await response_engine.quarantine_device(
@@ -964,7 +1038,7 @@ async def quarantine_device_endpoint(
     
     # Log audit
     await log_audit(
-        user_id=user.get("id", "unknown"),
+        user_id=user.id,
         action="device_quarantined",
         details={"device_id": device_id, "source_ip": source_ip}
     )
@@ -983,14 +1057,14 @@ async def quarantine_device_endpoint(
 async def revoke_session_endpoint(
     user_id: str,
     incident_id: Optional[str] = Query(None),
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Revoke a user's session"""
     result = await response_engine.revoke_user_session(user_id, incident_id or "manual")
     
     # Log audit
     await log_audit(
-        user_id=user.get("id", "unknown"),
+        user_id=user.id,
         action="session_revoked",
         details={"target_user_id": user_id, "incident_id": incident_id}
     )
@@ -999,13 +1073,13 @@ async def revoke_session_endpoint(
 
 
 @app.get("/api/response/quarantined-devices")
-async def get_quarantined_devices(user: Dict = Depends(get_current_user)):
+async def get_quarantined_devices(user: AuthUser = Depends(get_current_user)):
     """Get list of quarantined devices"""
     return response_engine.get_quarantined_devices()
 
 
 @app.get("/api/response/isolated-processes")
-async def get_isolated_processes(user: Dict = Depends(get_current_user)):
+async def get_isolated_processes(user: AuthUser = Depends(get_current_user)):
     """Get list of isolated processes"""
     return response_engine.get_isolated_processes()
 
@@ -1013,7 +1087,7 @@ async def get_isolated_processes(user: Dict = Depends(get_current_user)):
 @app.get("/api/response/action-log")
 async def get_response_action_log(
     limit: int = Query(50, ge=1, le=200),
-    user: Dict = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user)
 ):
     """Get response action audit log"""
     return {"actions": response_engine.get_action_log(limit)}
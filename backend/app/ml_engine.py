@@ -82,10 +82,24 @@ class MLAnomalyDetector:
             }
         
         try:
+            # Look up DB-backed features once per distinct IP / event type
+            # instead of once per event
+            source_ips = list({e.get("source_ip", "0.0.0.0") for e in events})
+            event_types = {e.get("type", "unknown") for e in events}
+            frequencies = await database.get_event_frequencies(source_ips, minutes=5)
+            type_rarities = {t: await database.get_event_type_rarity(t) for t in event_types}
+            ip_rarities = {ip: await database.get_ip_rarity(ip) for ip in source_ips}
+            
             # Extract features from events
             features = []
             for event in events:
-                feature_vector = await self._extract_features_async(event)
+                source_ip = event.get("source_ip", "0.0.0.0")
+                feature_vector = await self._extract_features_async(
+                    event,
+                    type_rarity=type_rarities[event.get("type", "unknown")],
+                    ip_rarity=ip_rarities[source_ip],
+                    event_freq=frequencies.get(source_ip, 0)
+                )
                 if feature_vector is not None:
                     features.append(feature_vector)
             
@@ -207,17 +221,29 @@ class MLAnomalyDetector:
             print(f"[ML] Entropy calculation error: {e}")
             return 0.5
     
-    async def _extract_features_async(self, event: Dict[str, Any]) -> Optional[List[float]]:
-        """Extract features asynchronously (for training with DB lookups)"""
+    async def _extract_features_async(
+        self,
+        event: Dict[str, Any],
+        type_rarity: Optional[float] = None,
+        ip_rarity: Optional[float] = None,
+        event_freq: Optional[int] = None
+    ) -> Optional[List[float]]:
+        """
+        Extract features asynchronously (for training with DB lookups).
+        Pre-fetched rarity/frequency values skip the per-event DB lookups.
+        """
         try:
             details = event.get("details", {})
             source_ip = event.get("source_ip", "0.0.0.0")
             event_type = event.get("type", "unknown")
             
             # Get rarity and frequency from database
-            type_rarity = await database.get_event_type_rarity(event_type)
-            ip_rarity = await database.get_ip_rarity(source_ip)
-            event_freq = await database.get_event_frequency(source_ip, minutes=5)
+            if type_rarity is None:
+                type_rarity = await database.get_event_type_rarity(event_type)
+            if ip_rarity is None:
+                ip_rarity = await database.get_ip_rarity(source_ip)
+            if event_freq is None:
+                event_freq = await database.get_event_frequency(source_ip, minutes=5)
             
             # Payload entropy
             payload_entropy = self.calculate_entropy(str(details))
@@ -117,7 +117,7 @@ ON DELETE CASCADE;
 
 CREATE TABLE IF NOT EXISTS public.ml_model (
     id INTEGER PRIMARY KEY DEFAULT 1,
-    model_data TEXT, -- Base64 encoded pickled model
+    model_data TEXT, -- Legacy base64 model (new models are in the ml-models bucket)
     trained_at TIMESTAMPTZ DEFAULT NOW(),
     training_samples INTEGER DEFAULT 0,
     model_version VARCHAR(50) DEFAULT '1.0',
@@ -128,6 +128,19 @@ CREATE TABLE IF NOT EXISTS public.ml_model (
 -- Ensure only one model row exists
 INSERT INTO public.ml_model (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
 
+-- The pickled model itself lives in the ml-models Storage bucket
+-- (ml-models/current.pkl); model_data is only read for legacy rows
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('ml-models', 'ml-models', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- The backend loads this object with pickle, so only the service role (the
+-- backend's SUPABASE_SERVICE_ROLE_KEY) may read or write it
+DROP POLICY IF EXISTS "Allow backend access on ml-models bucket" ON storage.objects;
+CREATE POLICY "Allow backend access on ml-models bucket" ON storage.objects
+    FOR ALL TO service_role
+    USING (bucket_id = 'ml-models') WITH CHECK (bucket_id = 'ml-models');
+
 -- ===========================================
 -- ML SCORES TABLE (Optional - for tracking)
 -- ===========================================
@@ -288,6 +301,38 @@ CREATE TRIGGER update_incidents_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Rarity scores for ML feature extraction (0-1, higher = rarer).
+-- The caller passes its cached events total, so each call is a single indexed
+-- count (idx_events_type / idx_events_source_ip) rather than a table scan.
+DROP FUNCTION IF EXISTS public.event_type_rarity(TEXT);
+DROP FUNCTION IF EXISTS public.ip_rarity(TEXT);
+
+CREATE OR REPLACE FUNCTION public.event_type_rarity(etype TEXT, total BIGINT)
+RETURNS FLOAT
+LANGUAGE sql STABLE AS $$
+    SELECT 1.0 - LEAST(COUNT(*)::FLOAT / GREATEST(total, 1), 1.0)
+    FROM public.events
+    WHERE type = etype;
+$$;
+
+CREATE OR REPLACE FUNCTION public.ip_rarity(ip_addr TEXT, total BIGINT)
+RETURNS FLOAT
+LANGUAGE sql STABLE AS $$
+    SELECT 1.0 - LEAST(COUNT(*)::FLOAT / GREATEST(total, 1), 1.0)
+    FROM public.events
+    WHERE source_ip = ip_addr;
+$$;
+
+-- Per-IP event counts since a cutoff, for scoring many IPs in one request
+CREATE OR REPLACE FUNCTION public.ip_event_counts(ips TEXT[], cutoff TIMESTAMPTZ)
+RETURNS TABLE(ip TEXT, cnt BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT source_ip, COUNT(*)
+    FROM public.events
+    WHERE source_ip = ANY(ips) AND timestamp >= cutoff
+    GROUP BY source_ip;
+$$;
+
 -- ===========================================
 -- SEED DATA (Optional)
 -- ===========================================
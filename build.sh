@@ -17,6 +17,10 @@ echo "Installing Python dependencies..."
 cd backend
 pip install -r requirements.txt
 
+# Precompile bytecode so the first start doesn't pay for parsing/compiling
+echo "Precompiling Python bytecode..."
+python -m compileall -q app server.py
+
 # Test import to make sure everything works
 echo "Testing Python imports..."
 python -c "from app.config import settings; print('Config loaded OK')"